@@ -69,12 +69,18 @@ def create_app(config_name):
     from .ambassador import ambassador as ambassador_blueprint
     app.register_blueprint(ambassador_blueprint, url_prefix='/ambassador')
 
+    from .utils.identity import load_user
+    from .utils.notification import store_drivers_room
+    login_manager.user_loader(load_user)
+
     @socketio.on("connect")
     def handle_connect(auth):
         try:
             if current_user.is_authenticated:
                 join_room(str(current_user.id))
                 print("User joined room:", current_user.id)
+                if current_user.user_type == "delivery_guy" and current_user.store_id:
+                    join_room(store_drivers_room(current_user.store_id))
         except RuntimeError:
             # Outside request context (e.g. during testing) - skip room join
             pass
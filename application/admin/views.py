@@ -5,14 +5,13 @@ from sqlalchemy import func, extract, or_, desc
 from ..models import *
 from datetime import datetime,timedelta
 import calendar
-from flask_login import login_required, current_user, logout_user,  LoginManager # type: ignore
+from flask_login import login_required, current_user, logout_user # type: ignore
 from . import admin
 from ..forms import *
 from ..models import db
 import os
 from application.auth import *
 import secrets
-from flask_bcrypt import Bcrypt
 from PIL import Image
 from flask import current_app
 import plotly.graph_objs as go # type: ignore
@@ -20,8 +19,7 @@ import plotly.offline as plot # type: ignore
 import cloudinary
 from cloudinary.uploader import upload
 from sqlalchemy.orm import joinedload
-
-bcrypt = Bcrypt()
+from application.utils.passwords import hash_password
 
 ACTIVE_ORDER_STATUSES = [
     "Pending",
@@ -86,28 +84,6 @@ def upload_to_cloudinary(file, folder='products'):
     )
     return result
 
-login_manager = LoginManager()
-login_manager.session_protection = 'strong'
-login_manager.login_view = 'auth.newlogin'
-
-@login_manager.user_loader
-def load_user(user_id):
-    user_type = session.get('user_type')
-    if user_type == 'store':
-        if Store.query.get(int(user_id)):
-            return Store.query.get(int(user_id))
-        else:
-            return Staff.query.get(int(user_id))
-    elif user_type == 'customer':
-        return User.query.get(int(user_id))
-    elif user_type == 'delivery_guy':
-        return DeliveryGuy.query.get(int(user_id))
-    elif user_type == 'administrator':
-        return Administrater.query.get(int(user_id))
-    elif user_type == 'ambassador':
-        return Ambassador.query.get(int(user_id))
-    return None
-
 
 @admin.route('/users', methods=["GET", "POST"])
 def reg_users():
@@ -164,29 +140,30 @@ def admindash():
     # Commission percentage for admin
     admin_commission = 0.10  # 10%
 
+    # Commission totals read from the sales rollups (utils.rollups), every order status
+    commission = func.sum(SalesRollupDaily.revenue) * admin_commission
+
     # Total commission earned by admin
-    total_sales = db.session.query(func.sum(Sales.price * Sales.quantity * admin_commission)).scalar() or 0.0
+    total_sales = db.session.query(commission).scalar() or 0.0
 
-    # Daily commission breakdown
+    # Daily commission breakdown (last 7 days with sales)
     daily_sales = db.session.query(
-        func.date(Sales.date_).label('date'),
-        func.sum(Sales.price * Sales.quantity * admin_commission).label('total')
-    ).group_by(func.date(Sales.date_)).order_by(func.date(Sales.date_)).all() or []
+        SalesRollupDaily.day.label('date'),
+        commission.label('total')
+    ).group_by(SalesRollupDaily.day).order_by(SalesRollupDaily.day.desc()).limit(7).all()[::-1]
 
     # Monthly commission
-    total_monthly_sales = db.session.query(
-        func.sum(Sales.price * Sales.quantity * admin_commission)
-    ).filter(Sales.date_ >= start_of_month, Sales.date_ <= end_of_month).scalar() or 0.0
+    total_monthly_sales = db.session.query(commission).filter(
+        SalesRollupDaily.day >= start_of_month.date(), SalesRollupDaily.day <= end_of_month.date()
+    ).scalar() or 0.0
 
     # Annual commission
-    total_annual_sales = db.session.query(
-        func.sum(Sales.price * Sales.quantity * admin_commission)
-    ).filter(Sales.date_ >= start_of_year, Sales.date_ <= end_of_year).scalar() or 0.0
+    total_annual_sales = db.session.query(commission).filter(
+        SalesRollupDaily.day >= start_of_year.date(), SalesRollupDaily.day <= end_of_year.date()
+    ).scalar() or 0.0
 
     # Today's commission
-    today_sales = db.session.query(
-        func.sum(Sales.price * Sales.quantity * admin_commission)
-    ).filter(func.date(Sales.date_) == today.date()).scalar() or 0.0
+    today_sales = db.session.query(commission).filter(SalesRollupDaily.day == today.date()).scalar() or 0.0
 
     recent_orders = (
         Order.query
@@ -220,9 +197,9 @@ def admindash():
         db.session.query(
             Store.id,
             Store.name,
-            func.coalesce(func.sum(Sales.price * Sales.quantity), 0.0).label("revenue")
+            func.coalesce(func.sum(SalesRollupDaily.revenue), 0.0).label("revenue")
         )
-        .join(Sales, Sales.store_id == Store.id)
+        .join(SalesRollupDaily, SalesRollupDaily.store_id == Store.id)
         .group_by(Store.id, Store.name)
         .order_by(desc("revenue"))
         .limit(5)
@@ -381,7 +358,7 @@ def manage_ambassadors():
         ambassador = Ambassador(
             names=names,
             email=email,
-            password=bcrypt.generate_password_hash(password).decode("utf-8"),
+            password=hash_password(password),
             referral_code=referral_code,
             commission_rate=commission_rate,
         )
@@ -473,6 +450,17 @@ def toggle_ambassador_coupon(coupon_id):
     flash(f'Coupon "{coupon.code}" {"activated" if coupon.is_active else "deactivated"}.', "success")
     return redirect(url_for("admin.manage_ambassadors"))
 
+@admin.route("/typeahead/rebuild", methods=["POST"])
+@login_required
+def rebuild_typeahead():
+    if session.get("user_type") != "administrator":
+        return jsonify({"success": False, "message": "Not authorised"}), 403
+
+    from application.utils.typeahead import schedule_rebuild
+    if not schedule_rebuild():
+        return jsonify({"success": False, "message": "Rebuild queue is full"}), 503
+    return jsonify({"success": True, "message": "Typeahead rebuild scheduled"})
+
 @admin.route("/ads", methods=["GET", "POST"])
 @login_required
 def manage_ads():
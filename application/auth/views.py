@@ -1,18 +1,13 @@
-from threading import Thread
 from datetime import datetime
 
 from flask import (
     session, flash, redirect, request,
     url_for, render_template, current_app
 )
-from flask_bcrypt import Bcrypt
 from flask_login import login_user
 from itsdangerous import URLSafeTimedSerializer, SignatureExpired, BadSignature
 from sqlalchemy.exc import IntegrityError
 
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail as SGMail
-
 from . import auth
 from .. import db, socketio
 from ..models import User, Store, DeliveryGuy, Staff, Administrater, Ambassador
@@ -21,12 +16,10 @@ from ..forms import (
     LoginForm, emailform, resetpassword, Set_StoreForm
 )
 from application.notification import notify_customer
-
-# --------------------------------------------------
-# INIT
-# --------------------------------------------------
-bcrypt = Bcrypt()
-
+from application.utils.accounts import find_account, load_account
+from application.utils.passwords import hash_password, check_password, needs_rehash
+from application.utils.metrics import metrics
+from application.utils.mail import send_mail
 
 # --------------------------------------------------
 # SERIALIZER (SAFE)
@@ -36,69 +29,43 @@ def get_serializer():
 
 
 # --------------------------------------------------
-# SENDGRID HELPERS
+# EMAIL HELPERS
 # --------------------------------------------------
-def send_async_email(app, message):
-    with app.app_context():
-        try:
-            sg = SendGridAPIClient(app.config["SENDGRID_API_KEY"])
-            print(app.config["SENDGRID_API_KEY"])
-            response = sg.send(message)
-            app.logger.info(f"SendGrid email sent | Status: {response.status_code}")
-        except Exception as e:
-            print(e)
-            app.logger.error("SENDGRID EMAIL ERROR")
-            app.logger.error(str(e))
-
-
 def send_confirmation_email(email):
     serializer = get_serializer()
     token = serializer.dumps(email)
     link = url_for("auth.confirm_email", token=token, _external=True)
 
-    message = SGMail(
-        from_email='khauhelo872@gmail.com',
-        to_emails=email,
-        subject="Confirm your SmartEats account",
-        html_content=f"""
+    send_mail(
+        email,
+        "Confirm your SmartEats account",
+        html=f"""
         <h2>Welcome to SmartEats </h2>
         <p>Please confirm your email:</p>
         <p><a href="{link}">Confirm my account</a></p>
         <br>
         <p>If you did not create this account, ignore this email.</p>
-        """
+        """,
+        sender='khauhelo872@gmail.com',
     )
 
-    Thread(
-        target=send_async_email,
-        args=(current_app._get_current_object(), message),
-        daemon=True
-    ).start()
-
 
 def send_reset_email(email):
     serializer = get_serializer()
     token = serializer.dumps(email)
     link = url_for("auth.reset", token=token, _external=True)
 
-    message = SGMail(
-        from_email=current_app.config["SENDGRID_FROM_EMAIL"],
-        to_emails=email,
-        subject="Reset your SmartEats password",
-        html_content=f"""
+    send_mail(
+        email,
+        "Reset your SmartEats password",
+        html=f"""
         <h3>Password Reset</h3>
         <p><a href="{link}">Reset Password</a></p>
         <br>
         <p>If you didn’t request this, ignore this email.</p>
-        """
+        """,
     )
 
-    Thread(
-        target=send_async_email,
-        args=(current_app._get_current_object(), message),
-        daemon=True
-    ).start()
-
 
 def confirm_token(token, expiration=86400):
     serializer = get_serializer()
@@ -155,7 +122,7 @@ def register():
             username=form.username.data,
             lastname=form.lastName.data,
             email=form.Email.data,
-            password=bcrypt.generate_password_hash(form.Password.data).decode("utf-8"),
+            password=hash_password(form.Password.data),
             referred_by_ambassador_id=referred_by.id if referred_by else None,
             referred_at=datetime.utcnow() if referred_by else None,
         )
@@ -205,7 +172,7 @@ def registerstore():
             email=form.email.data,
             phone=form.phone.data,
             openinghours=form.opening_hours_and_days.data,
-            password=bcrypt.generate_password_hash(form.password.data).decode("utf-8")
+            password=hash_password(form.password.data)
         )
         print("Store registered")
         db.session.add(store)
@@ -235,32 +202,23 @@ def newlogin():
         email = form.email.data
         password = form.password.data
 
-        user_sets = [
-            (User, "customer"),
-            (Administrater, "administrator"),
-            (Ambassador, "ambassador"),
-            (Store, "store"),
-            (DeliveryGuy, "delivery_guy"),
-            (Staff, "store")
-        ]
-
-        found_account = None
-        for model, role in user_sets:
-            account = model.query.filter_by(email=email).first()
-            if account:
-                found_account = (account, role)
-                break
-
-        if not found_account:
+        entry = find_account(email)
+        if not entry:
             flash("No account found with that email address.", "danger")
             return redirect(url_for("auth.newlogin"))
 
-        account, role = found_account
-
-        if not bcrypt.check_password_hash(account.password, password):
+        if not check_password(entry.password, password):
             flash("Incorrect password. Please try again.", "danger")
             return redirect(url_for("auth.newlogin"))
 
+        account, role = load_account(entry), entry.role
+
+        # cost factor changed since this hash was made
+        if needs_rehash(entry.password):
+            account.password = hash_password(password)
+            db.session.commit()
+            metrics.incr("password.rehash")
+
         if hasattr(account, "confirmed") and not account.confirmed:
             flash("Please confirm your email first.", "warning")
             return redirect(url_for("auth.newlogin"))
@@ -350,7 +308,7 @@ def reset(token):
     if form.validate_on_submit():
         account = User.query.filter_by(email=email).first() or Store.query.filter_by(email=email).first()
         if account:
-            account.password = bcrypt.generate_password_hash(form.password.data).decode("utf-8")
+            account.password = hash_password(form.password.data)
             db.session.commit()
             flash("Password reset successful.", "success")
             return redirect(url_for("auth.newlogin"))
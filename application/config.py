@@ -36,6 +36,60 @@ class Config:
     TWILIO_ACCOUNT_SID = os.environ.get('TWILIO_ACCOUNT_SID')
     TWILIO_AUTH_TOKEN = os.environ.get('TWILIO_AUTH_TOKEN')
     TWILIO_FROM_NUMBER = os.environ.get('TWILIO_FROM_NUMBER')
+    TWILIO_API_BASE = os.environ.get('TWILIO_API_BASE', 'https://api.twilio.com')
+    SMS_BACKEND = os.environ.get('SMS_BACKEND', 'twilio')
+    SMS_WORKERS = 2
+    SMS_QUEUE_SIZE = 500
+    SMS_REQUEUE_AFTER = 300
+    SMS_RATE_PER_SECOND = 1.0
+    SMS_BURST = 5
+    SMS_MAX_ATTEMPTS = 4
+    SMS_TIMEOUT = 8
+
+    # Outgoing email (sendgrid, smtp or fake)
+    EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'sendgrid')
+    SENDGRID_API_KEY = os.environ.get('SENDGRID_API_KEY')
+    SENDGRID_FROM_EMAIL = os.environ.get('SENDGRID_FROM_EMAIL')
+    EMAIL_WORKERS = 2
+    EMAIL_QUEUE_SIZE = 1000
+    EMAIL_BATCH_SIZE = 50
+    EMAIL_MAX_ATTEMPTS = 4
+
+    # Background workers
+    WORKERS_INLINE = False
+    PAYMENT_PROOF_SPOOL = os.path.join(basedir, 'spool', 'payment_proofs')
+    OUTBOX_WORKERS = 4
+    OUTBOX_POLL_INTERVAL = 2.0
+    OUTBOX_BATCH_SIZE = 100
+    OUTBOX_LEASE_SECONDS = 60
+    OUTBOX_MAX_ATTEMPTS = 6
+    OUTBOX_RETENTION_HOURS = 24
+    OUTBOX_PURGE_INTERVAL = 3600
+
+    # Typeahead index for /api/search
+    TYPEAHEAD_MAX_POSTINGS = 1000000  # document/prefix pairs, about 100 bytes each
+    TYPEAHEAD_REFRESH_SECONDS = 900
+
+    # Per-store catalog snapshots kept in memory
+    CATALOG_CACHE_STORES = 500
+
+    # Landing page sample pools
+    LANDING_MEALS_POOL_SIZE = 200
+    LANDING_RESTAURANTS_POOL_SIZE = 100
+    SAMPLE_POOL_TTL = 300
+
+    # Nearest-store search on /stores?lat=&lng=
+    STORE_SEARCH_RADIUS_KM = 15
+    STORE_GRID_TTL = 600
+    STORE_DIRECTORY_TTL = 300
+    IDENTITY_CACHE_TTL = 30
+    IDENTITY_CACHE_SIZE = 10000
+    BCRYPT_LOG_ROUNDS = 12
+    PASSWORD_HASH_CONCURRENCY = 4
+
+    # Responses replayed for repeated Idempotency-Key submissions
+    IDEMPOTENCY_TTL = 3600
+    IDEMPOTENCY_CACHE_SIZE = 50000
 
     # Flask-Profiler
     ENABLE_PROFILER = False
@@ -99,9 +153,27 @@ class ProductionConfig(Config):
         pass
 
 
+class TestingConfig(DevelopmentConfig):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SESSION_COOKIE_SECURE = False
+    USE_CLOUDINARY = False
+    WORKERS_INLINE = True
+    BCRYPT_LOG_ROUNDS = 4
+    EMAIL_BACKEND = 'fake'
+    SMS_ENABLED = True
+    SMS_BACKEND = 'fake'
+    TWILIO_ACCOUNT_SID = 'ACtest'
+    TWILIO_AUTH_TOKEN = 'test'
+    TWILIO_FROM_NUMBER = '+15005550006'
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+
+
 # Config dict
 config = {
     'development': DevelopmentConfig,
+    'testing': TestingConfig,
     'production': ProductionConfig,
     'default': ProductionConfig
      
@@ -5,36 +5,18 @@ from flask import (
     abort, render_template, redirect, url_for, flash, session, request, current_app, jsonify
 )
 from flask_login import login_required, current_user
-from flask_bcrypt import Bcrypt
 from sqlalchemy.exc import IntegrityError
 from . import delivery
 from ..forms import *
 from ..models import *
-from application.notification import notify_customer, notify_store
-from application.utils.notification import create_notification
-import flask_bcrypt
+from application.utils.outbox import enqueue
+from application.utils.store_directory import active_store_choices
+from application.utils.passwords import hash_password, check_password
 
-bcrypt = Bcrypt()
 import cloudinary
 from cloudinary.uploader import upload
 
 
-@login_manager.user_loader
-def load_user(user_id):
-    user_type = session.get('user_type')
-    if user_type == 'store':
-        return Store.query.get(int(user_id)) or Staff.query.get(int(user_id))
-    elif user_type == 'customer':
-        return User.query.get(int(user_id))
-    elif user_type == 'delivery_guy':
-        return DeliveryGuy.query.get(int(user_id))
-    elif user_type == 'administrator':
-        return Administrater.query.get(int(user_id))
-    elif user_type == 'ambassador':
-        return Ambassador.query.get(int(user_id))
-    return None
-
-
 def upload_to_cloudinary(file, folder='delivery_proofs'):
     result = upload(
         file,
@@ -69,7 +51,7 @@ def save_product_picture(file):
 def dashboard():
     store = Store.query.get(session.get('store_id'))
     formpharm = Set_StoreForm()
-    formpharm.store.choices = [(-1, "Select a Store")] + [(p.id, p.name) for p in Store.query.filter_by(is_active=True).all()]
+    formpharm.store.choices = active_store_choices()
 
     # Optional date filter
     start_date_str = request.args.get('start_date')
@@ -240,7 +222,7 @@ def mydeliveries():
         Delivery.status == "Out for Delivery"
     ).all()
     formpharm = Set_StoreForm()
-    formpharm.store.choices = [(-1, "Select a Store")] + [(p.id, p.name) for p in Store.query.filter_by(is_active=True).all()]
+    formpharm.store.choices = active_store_choices()
     return render_template(
         'delivery/ActiveOrder.html',
         myform=myform,
@@ -344,13 +326,14 @@ def update_delivery(delivery_id):
         else:
             delivery_obj.customer_pic = save_product_picture(form.delivery_prove.data)
 
+    message = f"Delivery #{delivery_obj.id} status changed from {old_status} to {new_status}"
+    enqueue("notification", user_type='customer', user_id=order.user_id, message=message)
+    enqueue("notification", user_type='store', user_id=order.store_id, message=message)
+    enqueue("emit", event="play_sound", data={"sound": "order_update"}, room=str(order.user_id))
+    enqueue("emit", event="play_sound", data={"sound": "new_order"}, room=str(order.store_id))
+
     try:
         db.session.commit()
-        message = f"Delivery #{delivery_obj.id} status changed from {old_status} to {new_status}"
-        create_notification('customer', order.user_id, message)
-        create_notification('store', order.store_id, message)
-        notify_customer(order.user_id)
-        notify_store(order.store_id)
         flash('Delivery status successfully updated.')
     except IntegrityError:
         db.session.rollback()
@@ -364,7 +347,7 @@ def update_delivery(delivery_id):
 @login_required
 def set_store():
     formpharm = Set_StoreForm()
-    formpharm.store.choices = [(-1, "Select a Store")] + [(p.id, p.name) for p in Store.query.filter_by(is_active=True).all()]
+    formpharm.store.choices = active_store_choices()
     if formpharm.validate_on_submit():
         session['store_id'] = formpharm.store.data
         flash(f'Store changed successfully.', 'success')
@@ -384,7 +367,7 @@ def updatepassword():
             flash('All fields are required.', 'danger')
             return redirect(url_for('delivery.updatepassword'))
 
-        if not bcrypt.check_password_hash(current_user.password, old_password):
+        if not check_password(current_user.password, old_password):
             flash('Old password is incorrect.', 'danger')
             return redirect(url_for('delivery.updatepassword'))
 
@@ -392,7 +375,7 @@ def updatepassword():
             flash('New passwords do not match.', 'danger')
             return redirect(url_for('delivery.updatepassword'))
 
-        current_user.password = bcrypt.generate_password_hash(new_password).decode('utf-8')
+        current_user.password = hash_password(new_password)
         db.session.commit()
         flash('Password updated successfully.', 'success')
         return redirect(url_for('delivery.dashboard'))
@@ -1,17 +1,14 @@
-from threading import Thread
-from flask_mail import Message # type: ignore
-
 from flask import current_app, render_template
 
-from application import mail
+from application.utils.mail import send_mail
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
 
 def send_email(to, subject, template, **kwargs):
-    msg = Message(current_app.config['FLASKY_MAIL_SUBJECT_PREFIX'] + subject,
-    sender=current_app.config['FLASKY_MAIL_SENDER'], recipients=[to])
-    msg.body = render_template('templates/auth/email/confirm' + '.html', **kwargs)
-    #msg.html = render_template(template + '.html', **kwargs)
-    mail.send(msg)
+    body = render_template('templates/auth/email/confirm' + '.html', **kwargs)
+    #html = render_template(template + '.html', **kwargs)
+    return send_mail(
+        to,
+        current_app.config['FLASKY_MAIL_SUBJECT_PREFIX'] + subject,
+        text=body,
+        sender=current_app.config['FLASKY_MAIL_SENDER'],
+    )
@@ -3,10 +3,10 @@ import secrets
 import re
 from datetime import datetime
 from typing import Self
-from flask import render_template, redirect, url_for, flash, session, jsonify, request, current_app
+from flask import render_template, redirect, url_for, flash, session, jsonify, request, current_app, has_request_context, abort
 from flask_login import login_required, current_user, logout_user
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import desc, func, or_, case
+from sqlalchemy import desc, func, or_, case, insert, update
 from PIL import Image
 import cloudinary
 from cloudinary.uploader import upload
@@ -22,9 +22,25 @@ from application.notification import *
 from application.auth.views import send_sound
 from application.utils.cache import *
 from application.utils.sms import normalize_phone_number
+from application.utils.cart import cart_summary, cart_view, refresh_cart_view
+from application.utils.uploads import spool_payment_proof, queue_payment_proof, PROOF_PENDING
+from application.utils.idempotency import idempotent
+from application.utils.metrics import metrics
+from application.utils.outbox import enqueue
+from application.utils.search import search_products, search_stores
+from application.utils.typeahead import typeahead_search
+from application.utils.catalog import (catalog_snapshot, catalog_response, snapshot_product,
+                                       page_etag, conditional_page)
+from application.utils.sampling import landing_meals, landing_restaurants
+from application.utils.sitemap import sitemap_index_response, sitemap_shard_response
+from application.utils.geo import calculate_delivery_fee, store_grid
+from application.utils.hours import parse_opening_hours, is_open_at, minute_of_day, open_now_clause
+from application.utils.store_directory import active_store_choices
 from application import socketio, db
 from flask_socketio import join_room
 PRODUCTS_PER_PAGE = 9
+LANDING_MEALS = 6
+LANDING_RESTAURANTS = 6
 
 ACTIVE_ORDER_STATUSES = [
     "Pending",
@@ -48,11 +64,15 @@ def active_stores_query():
     return Store.query.filter(Store.is_active.is_(True))
 
 
-def active_store_choices():
-    return [(-1, "Select a Store")] + [
-        (store.id, store.name)
-        for store in active_stores_query().order_by(Store.name.asc()).all()
-    ]
+def paginate(query, page_num, per_page=PRODUCTS_PER_PAGE):
+    """
+    Return (items, total_pages) with LIMIT/OFFSET in SQL and a separate
+    COUNT, so a page never loads the rest of the result set.
+    """
+    page_num = max(page_num, 1)
+    total = query.order_by(None).count()
+    items = query.limit(per_page).offset((page_num - 1) * per_page).all()
+    return items, (total + per_page - 1) // per_page
 
 
 def active_meals_query():
@@ -65,22 +85,6 @@ def active_meals_query():
         )
     )
 
-# --------------------- USER LOADER ---------------------
-def init_login_manager(login_manager):
-    @login_manager.user_loader
-    def load_user(user_id):
-        user_type = session.get('user_type')
-        if user_type == 'store':
-            return Store.query.get(int(user_id)) or Staff.query.get(int(user_id))
-        elif user_type == 'customer':
-            return User.query.get(int(user_id))
-        elif user_type == 'delivery_guy':
-            return DeliveryGuy.query.get(int(user_id))
-        elif user_type == 'administrator':
-            return Administrater.query.get(int(user_id))
-        elif user_type == 'ambassador':
-            return Ambassador.query.get(int(user_id))
-        return None
 # --------------------- UTILITIES ---------------------
 
 def update_product_status(Product):
@@ -128,115 +132,71 @@ def award_referral_commission(order, qualifying_amount):
     return commission
 
 
-from math import radians, sin, cos, sqrt, atan2
-
-def haversine_meters(lat1, lon1, lat2, lon2):
+def materialize_order(order, cart_items, user_id):
     """
-    Calculate great-circle distance in meters
+    Write OrderItem and Sales rows for every cart item with two bulk inserts.
+    cart_items must already have product/custom_meal loaded. Returns the
+    item subtotal (excluding delivery).
     """
-    R = 6371000  # Earth radius in meters
-
-    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-
-    dlat = lat2 - lat1
-    dlon = lon2 - lon1
-
-    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-
-    return R * c
-
-
-def calculate_delivery_fee(store_lat, store_lng, cust_lat, cust_lng,
-                           store_radius=500,
-                           inside_min_fee=10,
-                           normal_min_fee=13,
-                           rate_per_meter=0.01,
-                           max_fee=10000):
-
-    distance_m = haversine_meters(
-        store_lat,
-        store_lng,
-        cust_lat,
-        cust_lng
-    )
+    order_items = []
+    sales = []
+    custom_meal_ids = []
+    total_amount = 0
 
-    # Same logic as JS
-    if distance_m <= store_radius:
-        fee = inside_min_fee
-    else:
-        fee = max(distance_m * rate_per_meter, normal_min_fee)
+    for item in cart_items:
+        if item.product:
+            product = item.product
+            order_items.append({
+                "order_id": order.id,
+                "product_id": product.id,
+                "product_name": product.productname,
+                "product_price": product.price,
+                "quantity": item.quantity,
+                "notes": item.notes or '',
+            })
+            sales.append({
+                "order_id": order.id,
+                "user_id": user_id,
+                "product_id": product.id,
+                "product_name": product.productname,
+                "price": product.price,
+                "quantity": item.quantity,
+                "store_id": order.store_id,
+            })
+            total_amount += product.price * item.quantity
+        elif item.custom_meal:
+            meal = item.custom_meal
+            custom_meal_ids.append(meal.id)
+            sales.append({
+                "order_id": order.id,
+                "user_id": user_id,
+                "product_id": None,
+                "product_name": meal.name,
+                "price": meal.total_price,
+                "quantity": 1,
+                "store_id": order.store_id,
+            })
+            total_amount += meal.total_price
+
+    if order_items:
+        db.session.execute(insert(OrderItem), order_items)
+    if sales:
+        db.session.execute(insert(Sales), sales)
+    if custom_meal_ids:
+        CustomMeal.query.filter(CustomMeal.id.in_(custom_meal_ids)).update(
+            {"order_id": order.id}, synchronize_session=False
+        )
 
-    return round(min(fee, max_fee), 2)
+    return total_amount
 
 
 def is_store_open(opening_hours):
     """
-    Returns True if store is open, False otherwise.
-    Handles messy formats like:
-    - "Orders from 8am - 10pm"
-    - "8am - 10pm"
-    - "08:00 to 21:00"
-    - "24/7"
+    Returns True if store is open, False otherwise. Prefer Store.is_open_now,
+    which reads the schedule compiled on save; this parses (cached) free text.
     """
-    print(f"[DEBUG] Checking opening hours: {opening_hours}")
-
-    if not opening_hours:
-        print("[DEBUG] No opening hours → Closed")
-        return False
-
-    opening_hours = opening_hours.lower()
-
-    # Handle "24/7" explicitly
-    if "24/7" in opening_hours:
-        print("[DEBUG] 24/7 store → Open")
-        return True
-
-    # Regex to extract two times (HH:MM or H[H]?am/pm)
-    time_matches = re.findall(r'(\d{1,2}(?::\d{2})?\s*(?:am|pm)?)', opening_hours)
-    print(f"[DEBUG] Extracted times: {time_matches}")
-
-    if len(time_matches) != 2:
-        print("[DEBUG] Could not find exactly 2 times → Closed")
-        return False
-
-    open_str, close_str = time_matches
-    now = datetime.now().time()
-    print(f"[DEBUG] Current time: {now}")
-
-    # Try possible formats
-    for fmt in ("%H:%M", "%I%p", "%I:%M%p"):
-        try:
-            open_time = datetime.strptime(open_str.strip(), fmt).time()
-            close_time = datetime.strptime(close_str.strip(), fmt).time()
-            print(f"[DEBUG] Parsed with format {fmt}: Open={open_time}, Close={close_time}")
-            break
-        except ValueError:
-            continue
-    else:
-        print("[DEBUG] Could not parse times → Closed")
-        return False
-
-    # Check if store is open
-    if open_time < close_time:
-        is_open = open_time <= now <= close_time
-        print(f"[DEBUG] Regular hours → is_open: {is_open}")
-        return is_open
-    else:
-        is_open = now >= open_time or now <= close_time
-        print(f"[DEBUG] Overnight hours → is_open: {is_open}")
-        return is_open
-
-def upload_to_cloudinary(file, folder='payment_proofs'):
-    result = upload(
-        file,
-        folder=folder,
-        use_filename=True,
-        unique_filename=True,
-        resource_type='image',
-        transformation=[{'width': 300, 'height': 300, 'crop': 'fill'}, {'quality': 'auto'}]
-    )
-    return result
+    opens_at, closes_at = parse_opening_hours(opening_hours)
+    return is_open_at(opens_at, closes_at, minute_of_day())
 
 def human_duration(start_date, end_date=None):
     if not start_date:
@@ -314,6 +274,17 @@ def unsubscribe():
     return jsonify({"success": True})"""
 
 
+# ---------------- CART BADGE ----------------
+@main.app_context_processor
+def inject_cart_badge():
+    """Serve the navbar cart count from the cart read model on every page."""
+    if not has_request_context() or session.get('user_type') != 'customer':
+        return {}
+    if not current_user.is_authenticated:
+        return {}
+    return {"total_count": cart_view(current_user.id, session.get('store_id'))["count"]}
+
+
 # ---------------- HOME ----------------
 @main.route('/home', methods=["POST", "GET"])
 @login_required
@@ -322,9 +293,9 @@ def home():
     pharmacies = active_stores_query().order_by(Store.name.asc()).all()
     formpharm.store.choices = active_store_choices()
     store_id = session.get('store_id')
-    cart = Cart.query.filter(Cart.user_id==current_user.id, Cart.store_id == store_id).first()
-    total_amount = cart.total_amount() if cart else 0.0
-    total_count = cart.total_items() if cart else 0
+    cart_state = cart_view(current_user.id, store_id)
+    total_amount = cart_state["subtotal"]
+    total_count = cart_state["count"]
     orders_count = Order.query.filter_by(user_id=current_user.id).count()
     ads = Ad.query.all()
     return render_template("customer/home.html", user=current_user, total_count=total_count,
@@ -337,39 +308,24 @@ def api_search():
     if len(q) < 2:
         return jsonify({"restaurants": [], "meals": []})
 
-    # Search restaurants
-    restaurants = Store.query.filter(
-        Store.is_active == True,
-        or_(
-            Store.name.ilike(f"%{q}%"),
-            Store.district.ilike(f"%{q}%"),
-            Store.town.ilike(f"%{q}%")
-        )
-    ).limit(5).all()
-
-    # Search meals
-    meals = active_meals_query().filter(
-        or_(
-            Product.productname.ilike(f"%{q}%"),
-            Product.description.ilike(f"%{q}%")
-        )
-    ).limit(5).all()
+    # Restaurants and meals come from the in-memory typeahead index
+    restaurants, meals = typeahead_search(q, limit=5)
 
     return jsonify({
         "restaurants": [{
-            "id": r.id,
-            "name": r.name,
-            "district": r.district or "",
-            "town": r.town or "",
-            "url": url_for('main.store_details', store_id=r.id) if current_user.is_authenticated else url_for('auth.newlogin')
+            "id": r["id"],
+            "name": r["name"],
+            "district": r["district"],
+            "town": r["town"],
+            "url": url_for('main.store_details', store_id=r["id"]) if current_user.is_authenticated else url_for('auth.newlogin')
         } for r in restaurants],
         "meals": [{
-            "id": m.id,
-            "name": m.productname,
-            "price": f"M{m.price:.2f}",
-            "image": m.pictures or url_for('static', filename='css/images/default.png'),
-            "store": m.store.name if m.store else "",
-            "url": url_for('main.viewproduct', product_id=m.id) if current_user.is_authenticated else url_for('auth.newlogin')
+            "id": m["id"],
+            "name": m["name"],
+            "price": f"M{m['price']:.2f}",
+            "image": m["image"] or url_for('static', filename='css/images/default.png'),
+            "store": m["store"],
+            "url": url_for('main.viewproduct', product_id=m["id"]) if current_user.is_authenticated else url_for('auth.newlogin')
         } for m in meals]
     })
 
@@ -383,98 +339,20 @@ def robots_txt():
 
 @main.route("/sitemap.xml")
 def sitemap_xml():
-    """Generate dynamic XML sitemap."""
-    from xml.sax.saxutils import escape as xml_escape
-    
-    pages = []
-    
-    # Static pages
-    base_url = url_for('main.landing', _external=True)
-    pages.append({
-        'loc': base_url,
-        'changefreq': 'weekly',
-        'priority': '1.0'
-    })
-    pages.append({
-        'loc': url_for('main.restuarants', _external=True),
-        'changefreq': 'daily',
-        'priority': '0.9'
-    })
-    pages.append({
-        'loc': url_for('main.about', _external=True),
-        'changefreq': 'monthly',
-        'priority': '0.5'
-    })
-    pages.append({
-        'loc': url_for('main.privacy_policy', _external=True),
-        'changefreq': 'monthly',
-        'priority': '0.3'
-    })
-    pages.append({
-        'loc': url_for('main.terms_conditions', _external=True),
-        'changefreq': 'monthly',
-        'priority': '0.3'
-    })
-    
-    # Auth pages
-    pages.append({
-        'loc': url_for('auth.register', _external=True),
-        'changefreq': 'monthly',
-        'priority': '0.6'
-    })
-    pages.append({
-        'loc': url_for('auth.newlogin', _external=True),
-        'changefreq': 'monthly',
-        'priority': '0.6'
-    })
-    pages.append({
-        'loc': url_for('auth.registerstore', _external=True),
-        'changefreq': 'monthly',
-        'priority': '0.6'
-    })
-    
-    # Active stores
-    stores = Store.query.filter_by(is_active=True).all()
-    for store in stores:
-        pages.append({
-            'loc': url_for('main.store_details', store_id=store.id, _external=True),
-            'changefreq': 'daily',
-            'priority': '0.8'
-        })
-    
-    # Active meals
-    meals = active_meals_query().all()
-    for meal in meals:
-        pages.append({
-            'loc': url_for('main.viewproduct', product_id=meal.id, _external=True),
-            'changefreq': 'weekly',
-            'priority': '0.7'
-        })
-    
-    xml = '<?xml version="1.0" encoding="UTF-8"?>\n'
-    xml += '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
-    for page in pages:
-        xml += '  <url>\n'
-        xml += f'    <loc>{xml_escape(page["loc"])}</loc>\n'
-        if page.get('lastmod'):
-            xml += f'    <lastmod>{page["lastmod"]}</lastmod>\n'
-        xml += f'    <changefreq>{page["changefreq"]}</changefreq>\n'
-        xml += f'    <priority>{page["priority"]}</priority>\n'
-        xml += '  </url>\n'
-    xml += '</urlset>'
-    
-    return current_app.response_class(xml, mimetype='application/xml')
+    """Sitemap index pointing at the static-page, store and meal sub-sitemaps."""
+    return sitemap_index_response()
+
+@main.route("/sitemap-<kind>-<int:shard>.xml")
+def sitemap_shard(kind, shard):
+    """One sub-sitemap of at most 50k URLs, streamed and cached until its rows change."""
+    return sitemap_shard_response(kind, shard)
 
 @main.route("/", methods=["POST", "GET"])
 def landing():
     ads = Ad.query.all()
-    restaurants = Store.query.filter_by(is_active=True).order_by(func.random()).limit(6).all()
-    meals = (
-        Product.query
-        .filter_by(is_active=True)
-        .order_by(func.random())
-        .all()
-    )
+    # Random picks come from precomputed pools instead of ORDER BY random()
+    restaurants = landing_restaurants.sample(LANDING_RESTAURANTS)
+    meals = landing_meals.sample(LANDING_MEALS)
 
     seo_defaults = {
         'title': 'SmartEats – Food Delivery in Maputsoe, Roma & Leribe | Lesotho',
@@ -515,17 +393,23 @@ def cart():
     formpharm.store.choices = active_store_choices()
 
     user = current_user
-    cart = Cart.query.filter_by(user_id=user.id, store_id=store_id).first()
-    total_amount = 0.0
-    total_count = 0
-    if cart:
-        total_amount = cart.total_amount()
-
-        total_count = sum(item.quantity for item in cart.cart_items)
+    cart = (
+        Cart.query
+        .filter_by(user_id=user.id, store_id=store_id)
+        .options(
+            joinedload(Cart.cart_items).joinedload(CartItem.product),
+            joinedload(Cart.cart_items).joinedload(CartItem.custom_meal),
+        )
+        .first()
+    )
+    cart_state = refresh_cart_view(user.id, store_id)
+    total_amount = cart_state["subtotal"]
+    total_count = cart_state["count"]
 
     return render_template('customer/updated_cartlist.html', form=form, form2=form2, form3=form3,
                            cart=cart, user=user, formpharm=formpharm, store=Store.query.filter_by(id=store_id, is_active=True).first_or_404(),
-                           total_amount=total_amount, total_count=total_count, is_store_open=is_store_open)
+                           total_amount=total_amount, total_count=total_count, is_store_open=is_store_open,
+                           idempotency_key=secrets.token_urlsafe(16))
 @main.route("/go-to-store/<int:store_id>")
 def go_to_store(store_id):
     Store.query.filter_by(id=store_id, is_active=True).first_or_404()
@@ -548,47 +432,50 @@ def menu(page_num=1):
     # Populate store choices
     formpharm.store.choices = active_store_choices()
 
-    # Forms
-    form = CartlistForm()
-    form2 = Search()
-
-    # Get all active categories for this store
-    categories = Category.query.filter_by(store_id=mystore.id, is_active=True).all()
+    # Active categories come from the versioned catalog snapshot
+    snapshot = catalog_snapshot(mystore.id)
+    categories = snapshot["categories"]
 
     # Get selected category from query params (optional)
     selected_category_id = request.args.get("category", type=int)
 
-    # Query products
-    query = Product.query.filter_by(store_id=mystore.id, is_active=True)
-    if selected_category_id:
-        query = query.filter_by(category_id=selected_category_id)
+    # Cart count
+    total_count = cart_view(current_user.id, mystore.id)["count"]
 
-    products = query.all()
+    def render():
+        # Forms
+        form = CartlistForm()
+        form2 = Search()
 
-    # Pagination
-    start = (page_num - 1) * PRODUCTS_PER_PAGE
-    end = start + PRODUCTS_PER_PAGE
-    current_products = products[start:end]
-    total_pages = (len(products) // PRODUCTS_PER_PAGE) + (1 if len(products) % PRODUCTS_PER_PAGE > 0 else 0)
+        # Query products
+        query = Product.query.filter_by(store_id=mystore.id, is_active=True)
+        if selected_category_id:
+            query = query.filter_by(category_id=selected_category_id)
 
-    # Cart count
-    cart = Cart.query.filter_by(user_id=current_user.id, store_id=mystore.id).first()
-    total_count = sum(item.quantity for item in cart.cart_items) if cart else 0
+        # Pagination
+        current_products, total_pages = paginate(query.order_by(Product.id), page_num)
 
-    return render_template(
-        "customer/updated_menu.html",
-        form=form,
-        formpharm=formpharm,
-        form2=form2,
-        products=current_products,
-        categories=categories,
-        selected_category_id=selected_category_id,
-        page_num=page_num,
-        total_pages=total_pages,
-        total_count=total_count,
-        user=current_user,
-        store=mystore
+        return render_template(
+            "customer/updated_menu.html",
+            form=form,
+            formpharm=formpharm,
+            form2=form2,
+            products=current_products,
+            categories=categories,
+            selected_category_id=selected_category_id,
+            page_num=page_num,
+            total_pages=total_pages,
+            total_count=total_count,
+            user=current_user,
+            store=mystore
+        )
+
+    # Unchanged catalog, store, cart and page: the browser's copy is current
+    etag = page_etag(
+        snapshot, "menu", current_user.username, mystore.updated_at,
+        page_num, selected_category_id, total_count, tuple(formpharm.store.choices),
     )
+    return conditional_page(etag, render)
 
 # ---------------- CUSTOM MEAL ----------------
 @main.route("/custom_meal/<int:store_id>", methods=["GET", "POST"])
@@ -661,6 +548,7 @@ def custom_meal(store_id):
         db.session.add(cart_item)
 
         db.session.commit()
+        refresh_cart_view(current_user.id, store_id)
 
         return jsonify({
             "success": True,
@@ -676,14 +564,23 @@ def custom_meal(store_id):
 
 @main.route('/addorder', methods=['POST'])
 @login_required
+@idempotent('addorder', pending_endpoint='main.myorders')
 def addorder():
     form = confirmpurchase()
 
     store_id = session.get('store_id')
     store = Store.query.filter_by(id=store_id, is_active=True).first_or_404()
 
-    # Get cart
-    cart = Cart.query.filter_by(user_id=current_user.id, store_id=store_id).first()
+    # Get cart with its items, products and custom meals in one query
+    cart = (
+        Cart.query
+        .filter_by(user_id=current_user.id, store_id=store_id)
+        .options(
+            joinedload(Cart.cart_items).joinedload(CartItem.product),
+            joinedload(Cart.cart_items).joinedload(CartItem.custom_meal),
+        )
+        .first()
+    )
     if not cart or not cart.cart_items:
         flash("Your cart is empty.", "warning")
         return redirect(url_for('main.menu', page_num=1))
@@ -769,33 +666,36 @@ def addorder():
     points_discount = float(request.form.get('points_discount', 0))
 
     # Validate and process coupon
+    cart_subtotal = cart.total_amount()  # items are eager-loaded above
     if cart.ambassador_coupon_id and cart.ambassador_coupon:
         coupon = cart.ambassador_coupon
-        if coupon.is_valid(cart.total_amount()):
-            ambassador_discount = coupon.calculate_discount(cart.total_amount())
+        if coupon.is_valid(cart_subtotal) and coupon.redeem():
+            ambassador_discount = coupon.calculate_discount(cart_subtotal)
             ambassador_coupon_id = coupon.id
-            coupon.use()
         else:
             ambassador_discount = 0
             ambassador_coupon_id = None
             cart.ambassador_coupon_id = None
     elif cart.coupon_id and cart.coupon:
         coupon = cart.coupon
-        if coupon.is_valid(cart.total_amount()):
-            coupon_discount = coupon.calculate_discount(cart.total_amount())
+        # Claims a use atomically; fails if the last use was just taken
+        if coupon.is_valid(cart_subtotal) and coupon.redeem():
+            coupon_discount = coupon.calculate_discount(cart_subtotal)
             coupon_id = coupon.id
-            # Increment usage counter
-            coupon.use()
         else:
             coupon_discount = 0
             coupon_id = None
             cart.coupon_id = None
 
-    # Validate and process points redemption
-    if points_redeemed > 0 and current_user.loyalty_points >= points_redeemed:
-        # Deduct points from user
-        current_user.loyalty_points -= points_redeemed
-
+    # Validate and process points redemption; the balance check and the
+    # deduction are one statement so concurrent checkouts cannot overspend
+    claimed = points_redeemed > 0 and db.session.execute(
+        update(User)
+        .where(User.id == current_user.id, User.loyalty_points >= points_redeemed)
+        .values(loyalty_points=User.loyalty_points - points_redeemed)
+        .execution_options(synchronize_session="fetch")
+    ).rowcount == 1
+    if claimed:
         # Record the redemption
         redemption = PointsRedemption(
             user_id=current_user.id,
@@ -831,10 +731,6 @@ def addorder():
         points_discount=points_discount
     )
 
-    # Link redemption to order if created
-    if points_redeemed > 0:
-        redemption.order_id = neworder.id
-
     # -----------------------------
     # Payment Screenshot
     # -----------------------------
@@ -843,55 +739,21 @@ def addorder():
         flash("Payment proof is required.", "warning")
         return redirect(url_for('main.cart'))
 
-    if current_app.config.get('USE_CLOUDINARY'):
-        neworder.screenshot = upload_to_cloudinary(file)['secure_url']
-    else:
-        neworder.screenshot = save_product_picture(file)
+    # Spool locally; a background worker uploads it and fills in Order.screenshot
+    spool_path = spool_payment_proof(file)
+    neworder.proof_status = PROOF_PENDING
 
     db.session.add(neworder)
     db.session.flush()  # get neworder.id before commit
 
+    # Link redemption to order if created
+    if points_redeemed > 0:
+        redemption.order_id = neworder.id
+
     # -----------------------------
     # Process Cart Items
     # -----------------------------
-    total_amount = 0
-    for item in cart.cart_items:
-        if item.product:
-            order_item = OrderItem(
-                order_id=neworder.id,
-                product_id=item.product.id,
-                product_name=item.product.productname,
-                product_price=item.product.price,
-                quantity=item.quantity,
-                notes=item.notes or ''
-            )
-            db.session.add(order_item)
-            total_amount += item.product.price * item.quantity
-
-            sale = Sales(
-                order_id=neworder.id,
-                user_id=current_user.id,
-                product_id=item.product.id,
-                product_name=item.product.productname,
-                price=item.product.price,
-                quantity=item.quantity,
-                store_id=store.id
-            )
-            db.session.add(sale)
-        elif item.custom_meal:
-            item.custom_meal.order_id = neworder.id
-            total_amount += item.custom_meal.total_price
-
-            sale = Sales(
-                order_id=neworder.id,
-                user_id=current_user.id,
-                product_id=None,
-                product_name=item.custom_meal.name,
-                price=item.custom_meal.total_price,
-                quantity=1,
-                store_id=store.id
-            )
-            db.session.add(sale)
+    total_amount = materialize_order(neworder, cart.cart_items, current_user.id)
 
     total_amount += delivery_fee
     # NOTE: deliveryfee was already set at order creation (line 587) — do NOT overwrite with total
@@ -909,16 +771,16 @@ def addorder():
     # -----------------------------
     # Clear Cart
     # -----------------------------
-    CartItem.query.filter_by(cart_id=cart.id).delete()
-    db.session.commit()
-    cart_cache.clear_cache(current_user.id)
+    CartItem.query.filter_by(cart_id=cart.id).delete(synchronize_session=False)
 
     # -----------------------------
-    # Notify Store via SocketIO
+    # Notify Store (sent by the outbox once the order is committed)
     # -----------------------------
-    socketio.emit(
-        'new_order',
-        {
+    db.session.flush()
+    enqueue(
+        "emit",
+        event='new_order',
+        data={
             'order_id': neworder.id,
             'customer_email': current_user.email,
             'delivery_fee': delivery_fee,
@@ -928,13 +790,12 @@ def addorder():
         },
         room=f'store_{store.id}'
     )
-
     # Play sound notification for the store dashboard
-    try:
-        from application.notification import notify_store
-        notify_store(store.id)
-    except Exception:
-        pass
+    enqueue("emit", event="play_sound", data={"sound": "new_order"}, room=str(store.id))
+    queue_payment_proof(neworder, spool_path)
+
+    db.session.commit()
+    cart_cache.clear_cache(current_user.id)
 
     flash("Order successfully placed.", "success")
     return redirect(url_for('main.myorders'))
@@ -1011,6 +872,7 @@ def cancelled_orders():
 # ---------------- AJAX ----------------
 @main.route("/add_to_cart_ajax", methods=["POST"])
 @login_required
+@idempotent('add_to_cart')
 def add_to_cart_ajax():
     data = request.get_json() or {}
 
@@ -1076,8 +938,9 @@ def add_to_cart_ajax():
     db.session.commit()
 
     # Recalculate totals
-    cart_count = cart.total_items()
-    cart_total = cart.total_amount()
+    cart_state = refresh_cart_view(current_user.id, store_id)
+    cart_count = cart_state["count"]
+    cart_total = cart_state["subtotal"]
 
     try:
         socketio.emit(
@@ -1104,13 +967,9 @@ def remove_from_cart_ajax(item_id):
         return jsonify(success=False, error="forbidden"), 403
     db.session.delete(item)
     db.session.commit()
-    cart = Cart.query.filter_by(user_id=current_user.id, store_id=cart.store_id).first()
-    if not cart:
-        cart_count = 0
-        cart_total = 0.0
-    else:
-        cart_count = cart.total_items()
-        cart_total = cart.total_amount()
+    cart_state = refresh_cart_view(current_user.id, cart.store_id)
+    cart_count = cart_state["count"]
+    cart_total = cart_state["subtotal"]
     try:
         socketio.emit("cart_updated", {"cart_count": cart_count, "cart_total": cart_total}, room=str(current_user.id))
     except Exception as e:
@@ -1122,11 +981,9 @@ def remove_from_cart_ajax(item_id):
 @login_required
 def cart_status():
     store_id = session.get("store_id")
-    cart = Cart.query.filter_by(user_id=current_user.id, store_id=store_id).first()
-    if not cart:
-        return jsonify(success=True, cart_count=0, cart_total=0.0)
-    return jsonify(success=True, cart_count=cart.total_items(),
-                   cart_total=cart.total_amount())
+    cart_state = cart_view(current_user.id, store_id)
+    return jsonify(success=True, cart_count=cart_state["count"],
+                   cart_total=cart_state["subtotal"])
 
 # ---------------- ACCOUNT ----------------
 @main.route("/account", methods=["GET", "POST"])
@@ -1289,8 +1146,34 @@ def restuarants():
     form2 = Search()
     selected_location = request.args.get('location', '').strip()
     open_now = request.args.get('open_now', '').strip()
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    store_distances = {}
 
-    if current_user.is_authenticated:
+    base_query = active_stores_query()
+    if open_now == '1':
+        base_query = base_query.filter(open_now_clause(Store))
+
+    if lat is not None and lng is not None:
+        # Nearest stores first, within the radius, from the in-memory grid index
+        radius_km = min(request.args.get('radius', type=float) or current_app.config.get('STORE_SEARCH_RADIUS_KM', 15), 100)
+        hits = store_grid.nearby(lat, lng, radius_km * 1000)
+        for store_id, distance_m, s_lat, s_lng in hits:
+            store_distances[store_id] = {
+                'km': round(distance_m / 1000, 1),
+                'fee': calculate_delivery_fee(s_lat, s_lng, lat, lng, distance_m=distance_m),
+            }
+
+        query = base_query.filter(Store.id.in_(list(store_distances)))
+        if selected_location:
+            query = query.filter(
+                or_(
+                    Store.town.ilike(f"%{selected_location}%"),
+                    Store.district.ilike(f"%{selected_location}%")
+                )
+            )
+        stores = sorted(query.all(), key=lambda s: store_distances[s.id]['km'])
+    elif current_user.is_authenticated:
         user_district = current_user.district
         user_town = current_user.town
 
@@ -1300,7 +1183,7 @@ def restuarants():
             else_=2
         )
 
-        query = active_stores_query()
+        query = base_query
 
         # Filter by location (town or district)
         if selected_location:
@@ -1316,7 +1199,7 @@ def restuarants():
             Store.name.asc()
         ).all()
     else:
-        query = active_stores_query()
+        query = base_query
 
         # Filter by location (town or district)
         if selected_location:
@@ -1329,10 +1212,6 @@ def restuarants():
 
         stores = query.order_by(Store.name.asc()).all()
 
-    # Filter by open status
-    if open_now == '1':
-        stores = [s for s in stores if is_store_open(s.openinghours)]
-
     seo_defaults = {
         'title': f'Restaurants in {selected_location} – SmartEats Food Delivery Lesotho' if selected_location else 'Browse Restaurants – SmartEats Food Delivery Lesotho',
         'description': f'Discover the best local restaurants in {selected_location}, Lesotho. Order fresh meals online for fast delivery.' if selected_location else 'Browse all restaurants on SmartEats. Order from the best local food spots in Maputsoe, Roma, and Leribe, Lesotho.',
@@ -1349,6 +1228,7 @@ def restuarants():
 
     return render_template('customer/restuarants.html', stores=stores, form2=form2,
                            is_store_open=is_store_open, selected_location=selected_location, open_now=open_now,
+                           store_distances=store_distances,
                            seo_defaults=seo_defaults, breadcrumbs=breadcrumbs)
 
 @main.route("/store/<int:store_id>")
@@ -1362,13 +1242,9 @@ def store_details(store_id):
     open_now = request.args.get('open_now', '').strip()
 
     # Cart summary (if user already browsing this store)
-    cart = Cart.query.filter_by(
-        user_id=current_user.id,
-        store_id=restuarant.id
-    ).first()
-
-    total_count = cart.total_items() if cart else 0
-    total_amount = cart.total_amount() if cart else 0.0
+    cart_state = cart_view(current_user.id, restuarant.id)
+    total_count = cart_state["count"]
+    total_amount = cart_state["subtotal"]
 
     seo_defaults = {
         'title': f'{restuarant.name} – Restaurant in {restuarant.town or restuarant.district} | SmartEats Lesotho',
@@ -1396,6 +1272,14 @@ def store_details(store_id):
         open_now=open_now
     )
 
+# ---------------- CATALOG SNAPSHOT ----------------
+@main.route('/catalog/<int:store_id>')
+@login_required
+def catalog(store_id):
+    """Store catalog as JSON; clients revalidate with If-None-Match and usually get a 304."""
+    Store.query.filter_by(id=store_id, is_active=True).first_or_404()
+    return catalog_response(store_id)
+
 # ---------------- VIEW PRODUCT ----------------
 @main.route('/viewproduct/<int:product_id>')
 @login_required
@@ -1403,31 +1287,36 @@ def viewproduct(product_id):
     store_id = session.get('store_id')
     store = Store.query.filter_by(id=store_id, is_active=True).first_or_404()
 
-    product = Product.query.join(Store, Product.store_id == Store.id).filter(
-        Product.id == product_id,
-        Product.is_active.is_(True),
-        Store.is_active.is_(True),
-        Product.store_id == store.id
-    ).first_or_404()
-    
-    seo_defaults = {
-        'title': f'{product.productname} – {store.name} | SmartEats Lesotho',
-        'description': f'Order {product.productname} from {store.name} in {store.town or store.district}, Lesotho. M{product.price:.2f}. Fresh, delicious food delivered fast.',
-        'keywords': f'{product.productname}, {store.name}, food delivery, {product.productname} price, SmartEats',
-        'og_type': 'product',
-        'product_price': f'{product.price:.2f}',
-        'image': product.pictures or url_for('static', filename='css/images/default.png', _external=True),
-        'canonical': url_for('main.viewproduct', product_id=product.id, _external=True),
-    }
-    
-    breadcrumbs = [
-        {'name': 'Home', 'url': url_for('main.landing', _external=True)},
-        {'name': 'Restaurants', 'url': url_for('main.restuarants', _external=True)},
-        {'name': store.name, 'url': url_for('main.store_details', store_id=store.id, _external=True)},
-        {'name': product.productname, 'url': url_for('main.viewproduct', product_id=product.id, _external=True)},
-    ]
+    snapshot = catalog_snapshot(store.id)
+    product = snapshot_product(snapshot, product_id)
+    if product is None:
+        abort(404)
+
+    # The layout's cart badge
+    total_count = cart_view(current_user.id, store.id)["count"]
+
+    def render():
+        seo_defaults = {
+            'title': f'{product["productname"]} – {store.name} | SmartEats Lesotho',
+            'description': f'Order {product["productname"]} from {store.name} in {store.town or store.district}, Lesotho. M{product["price"]:.2f}. Fresh, delicious food delivered fast.',
+            'keywords': f'{product["productname"]}, {store.name}, food delivery, {product["productname"]} price, SmartEats',
+            'og_type': 'product',
+            'product_price': f'{product["price"]:.2f}',
+            'image': product["pictures"] or url_for('static', filename='css/images/default.png', _external=True),
+            'canonical': url_for('main.viewproduct', product_id=product["id"], _external=True),
+        }
+
+        breadcrumbs = [
+            {'name': 'Home', 'url': url_for('main.landing', _external=True)},
+            {'name': 'Restaurants', 'url': url_for('main.restuarants', _external=True)},
+            {'name': store.name, 'url': url_for('main.store_details', store_id=store.id, _external=True)},
+            {'name': product["productname"], 'url': url_for('main.viewproduct', product_id=product["id"], _external=True)},
+        ]
+
+        return render_template('customer/updated_productview.html', product=product, store=store, seo_defaults=seo_defaults, breadcrumbs=breadcrumbs)
 
-    return render_template('customer/updated_productview.html', product=product, store=store, seo_defaults=seo_defaults, breadcrumbs=breadcrumbs)
+    etag = page_etag(snapshot, "viewproduct", product_id, current_user.username, store.updated_at, total_count)
+    return conditional_page(etag, render)
 
 # ---------------- SEARCH ----------------
 @main.route("/search/<int:page_num>", methods=["POST", "GET"])
@@ -1445,30 +1334,18 @@ def search(page_num=1):
         search_term = form2.keyword.data.strip()
 
         # Filter by current store AND search term
-        products = Product.query.filter(
-            Product.store_id == store_id,
-            Product.is_active == True,
-            or_(
-                Product.productname.ilike(f"%{search_term}%"),
-                Product.description.ilike(f"%{search_term}%")
-            )
-        ).all()
-
-        start = (page_num - 1) * PRODUCTS_PER_PAGE
-        end = start + PRODUCTS_PER_PAGE
-        current_products = products[start:end]
-
-        total_pages = (
-            len(products) // PRODUCTS_PER_PAGE
-            + (1 if len(products) % PRODUCTS_PER_PAGE > 0 else 0)
+        products = search_products(
+            Product.query.filter(Product.store_id == store_id, Product.is_active == True),
+            search_term
         )
 
+        current_products, total_pages = paginate(products, page_num)
+
         # Get categories for the menu template
-        categories = Category.query.filter_by(store_id=mystore.id, is_active=True).all()
+        categories = catalog_snapshot(mystore.id)["categories"]
 
         # Cart count
-        cart = Cart.query.filter_by(user_id=current_user.id, store_id=mystore.id).first()
-        total_count = sum(item.quantity for item in cart.cart_items) if cart else 0
+        total_count = cart_view(current_user.id, mystore.id)["count"]
 
         # Populate store choices for the form
         formpharm = Set_StoreForm()
@@ -1501,21 +1378,10 @@ def searcher(page_num=1):
         search_term = form2.keyword.data.strip()
 
         # Filter stores by name, district, or town
-        stores = Store.query.filter(
-            Store.is_active == True,
-            or_(
-                Store.district.ilike(f"%{search_term}%"),
-                Store.town.ilike(f"%{search_term}%"),
-                Store.name.ilike(f"%{search_term}%")
-            )
-        ).all()
+        stores = search_stores(active_stores_query(), search_term)
 
         # Pagination
-        start = (page_num - 1) * PRODUCTS_PER_PAGE
-        end = start + PRODUCTS_PER_PAGE
-        current_stores = stores[start:end]
-
-        total_pages = (len(stores) // PRODUCTS_PER_PAGE) + (1 if len(stores) % PRODUCTS_PER_PAGE > 0 else 0)
+        current_stores, total_pages = paginate(stores, page_num)
 
         return render_template(
             "customer/restuarants.html",
@@ -1528,12 +1394,7 @@ def searcher(page_num=1):
         )
 
     # GET request or empty search: just show all stores
-    all_stores = active_stores_query().all()
-    start = (page_num - 1) * PRODUCTS_PER_PAGE
-    end = start + PRODUCTS_PER_PAGE
-    current_stores = all_stores[start:end]
-
-    total_pages = (len(all_stores) // PRODUCTS_PER_PAGE) + (1 if len(all_stores) % PRODUCTS_PER_PAGE > 0 else 0)
+    current_stores, total_pages = paginate(active_stores_query().order_by(Store.id), page_num)
 
     return render_template(
         "customer/restuarants.html",
@@ -1566,8 +1427,8 @@ def increment_cart_item(item_id):
     item.quantity += 1
     db.session.commit()
 
-    # Recalculate cart total using the model method (handles custom meals)
-    cart_total = cart.total_amount()
+    # Recalculate cart total (handles custom meals)
+    cart_total = refresh_cart_view(cart.user_id, cart.store_id)["subtotal"]
 
     return jsonify({
         'success': True,
@@ -1595,8 +1456,8 @@ def decrement_cart_item(item_id):
         db.session.commit()
         item.quantity = 0  # ensure front-end knows quantity is 0
 
-    # Recalculate cart total using the model method (handles custom meals)
-    cart_total = cart.total_amount()
+    # Recalculate cart total (handles custom meals)
+    cart_total = refresh_cart_view(cart.user_id, cart.store_id)["subtotal"]
 
     return jsonify({
         'success': True,
@@ -1628,11 +1489,12 @@ def apply_coupon():
         return jsonify({'success': False, 'message': 'Invalid coupon code.'}), 404
 
     # Get the cart
-    cart = Cart.query.filter_by(user_id=current_user.id, store_id=store_id).first()
-    if not cart or not cart.cart_items:
+    summary = cart_summary(current_user.id, store_id)
+    if not summary.count:
         return jsonify({'success': False, 'message': 'Your cart is empty.'}), 400
+    cart = db.session.get(Cart, summary.cart_id)
 
-    order_amount = cart.total_amount()
+    order_amount = summary.subtotal
 
     # Check validity
     if not coupon.is_valid(order_amount):
@@ -1652,6 +1514,7 @@ def apply_coupon():
         cart.coupon_id = coupon.id
         cart.ambassador_coupon_id = None
     db.session.commit()
+    refresh_cart_view(current_user.id, store_id)
 
     discount = coupon.calculate_discount(order_amount)
     total_after_discount = order_amount - discount
@@ -1684,7 +1547,7 @@ def remove_coupon():
     return jsonify({
         'success': True,
         'message': 'Coupon removed.',
-        'total_after_discount': cart.total_amount() if cart else 0
+        'total_after_discount': refresh_cart_view(current_user.id, store_id)["subtotal"]
     })
 
 
@@ -1697,25 +1560,24 @@ def coupon_status():
     if not store_id:
         return jsonify({'coupon': None}), 200
 
-    cart = Cart.query.filter_by(user_id=current_user.id, store_id=store_id).first()
-    if not cart or (not cart.coupon_id and not cart.ambassador_coupon_id):
+    summary = cart_summary(current_user.id, store_id)
+    if not summary.cart_id:
         return jsonify({'coupon': None}), 200
 
-    coupon = cart.ambassador_coupon if cart.ambassador_coupon_id else cart.coupon
+    coupon = summary.coupon
     if not coupon:
-        cart.coupon_id = None
-        cart.ambassador_coupon_id = None
-        db.session.commit()
         return jsonify({'coupon': None}), 200
 
-    order_amount = cart.total_amount()
+    order_amount = summary.subtotal
     if not coupon.is_valid(order_amount):
-        cart.coupon_id = None
-        cart.ambassador_coupon_id = None
+        Cart.query.filter_by(id=summary.cart_id).update(
+            {'coupon_id': None, 'ambassador_coupon_id': None}
+        )
         db.session.commit()
+        refresh_cart_view(current_user.id, store_id)
         return jsonify({'coupon': None}), 200
 
-    discount = coupon.calculate_discount(order_amount)
+    discount = summary.discount
 
     return jsonify({
         'coupon': {
@@ -1724,7 +1586,7 @@ def coupon_status():
             'discount_type': coupon.discount_type,
             'discount_value': coupon.discount_value,
             'total_after_discount': order_amount - discount,
-            'source': 'ambassador' if cart.ambassador_coupon_id else 'store',
+            'source': summary.coupon_source,
             'id': coupon.id
         }
     })
@@ -1745,8 +1607,8 @@ def redeem_points():
     if not store_id:
         return jsonify({'success': False, 'message': 'No store selected.'}), 400
 
-    cart = Cart.query.filter_by(user_id=current_user.id, store_id=store_id).first()
-    if not cart or not cart.cart_items:
+    summary = cart_summary(current_user.id, store_id)
+    if not summary.count:
         return jsonify({'success': False, 'message': 'Your cart is empty.'}), 400
 
     user = current_user
@@ -1760,10 +1622,10 @@ def redeem_points():
         return jsonify({'success': False, 'message': 'Points must be redeemed in multiples of 100.'}), 400
 
     discount = PointsRedemption.points_to_discount(points_to_redeem)
-    order_amount = cart.total_amount()
+    order_amount = summary.subtotal
 
     # Can't discount more than the order amount
-    coupon_discount = cart.get_discount()
+    coupon_discount = summary.discount
     effective_total = order_amount - coupon_discount
 
     if discount > effective_total:
@@ -1814,7 +1676,7 @@ def award_loyalty_points(user, order, amount_spent):
 
         # Create a notification
         try:
-            from application.notification import create_notification
+            from application.utils.notification import create_notification
             create_notification(
                 user_id=user.id,
                 user_type='customer',
@@ -1842,3 +1704,10 @@ def ping():
 @main.route("/health")
 def health():
     return "ok"
+
+@main.route("/metrics")
+@login_required
+def metrics_snapshot():
+    if session.get("user_type") != "administrator":
+        abort(403)
+    return jsonify(metrics.snapshot())
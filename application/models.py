@@ -7,7 +7,9 @@ from flask import current_app
 from flask_login import UserMixin
 from itsdangerous import TimedSerializer
 from sqlalchemy.dialects.postgresql import JSON
+from sqlalchemy.orm import validates
 from . import db, login_manager
+from .utils.hours import parse_opening_hours, is_open_at, minute_of_day
 
 # ----------------- Utilities -----------------
 def get_localTime():
@@ -28,6 +30,9 @@ class Store(UserMixin, db.Model):
     phone = db.Column(db.String(50), nullable=False)
 
     openinghours = db.Column(db.String(100), default="09:00 to 18:30")
+    # openinghours compiled to minutes of the day on save, see utils.hours
+    opens_at = db.Column(db.SmallInteger, index=True, default=parse_opening_hours("09:00 to 18:30")[0])
+    closes_at = db.Column(db.SmallInteger, index=True, default=parse_opening_hours("09:00 to 18:30")[1])
     password = db.Column(db.String(200), nullable=False)
 
     ecocash_name = db.Column(db.String(100), default="None")
@@ -45,6 +50,8 @@ class Store(UserMixin, db.Model):
     town = db.Column(db.String(60), nullable=True, default="None")
     is_active = db.Column(db.Boolean, default=True)
     registered_on = db.Column(db.DateTime, server_default=db.func.now())
+    catalog_version = db.Column(db.Integer, nullable=False, default=0, server_default="0")
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     
     users = db.relationship("User", back_populates="store")
@@ -55,6 +62,15 @@ class Store(UserMixin, db.Model):
     staff_members = db.relationship("Staff", back_populates="store", lazy="select")
     coupons = db.relationship("Coupon", back_populates="store", lazy="select")
 
+    @validates("openinghours")
+    def _compile_openinghours(self, key, value):
+        self.opens_at, self.closes_at = parse_opening_hours(value)
+        return value
+
+    @property
+    def is_open_now(self):
+        return is_open_at(self.opens_at, self.closes_at, minute_of_day())
+
 # ----------------- Product -----------------
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -69,6 +85,7 @@ class Product(db.Model):
     warning = db.Column(db.String(100), default="Quantity Good")
     is_active = db.Column(db.Boolean, default=True)
     store_id = db.Column(db.Integer, db.ForeignKey("store.id"))
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     # Relationships
     cart_items = db.relationship("CartItem", backref="product", lazy="select")
     order_items = db.relationship("OrderItem", backref="product", lazy="select")
@@ -229,6 +246,8 @@ class Order(db.Model):
 
     deliveryguy = db.Column(db.String(50), default="Not Taken")
     screenshot = db.Column(db.Text)
+    # pending -> uploaded / failed while the payment proof is processed in the background
+    proof_status = db.Column(db.String(20), nullable=True)
 
     deliveryfee = db.Column(db.Float, default=0.0)
     
@@ -379,6 +398,56 @@ class Sales(db.Model):
     store_id = db.Column(db.Integer, db.ForeignKey("store.id"), nullable=False)
     store = db.relationship("Store", back_populates="sales")
 
+    # Windowed per-store queries (top and repeat customers) read this range
+    __table_args__ = (
+        db.Index("ix_sales_store_date", "store_id", "date_"),
+    )
+
+
+# ----------------- Sales rollups -----------------
+# Gross sales (price * quantity) per order-status bucket, kept current by
+# utils.rollups at every order insert/status change; rebuild with
+# `flask sales-rollups`.
+class SalesRollupDaily(db.Model):
+    __tablename__ = "sales_rollup_daily"
+
+    store_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    bucket = db.Column(db.String(10), primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SalesRollupProduct(db.Model):
+    __tablename__ = "sales_rollup_product"
+    __table_args__ = (
+        db.Index("ix_sales_rollup_product_store_day", "store_id", "day"),
+        db.UniqueConstraint("store_id", "day", "product_id", "bucket"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    store_id = db.Column(db.Integer, nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    product_id = db.Column(db.Integer, nullable=False)
+    bucket = db.Column(db.String(10), nullable=False)
+    product_name = db.Column(db.String(50))
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SalesRollupHourly(db.Model):
+    __tablename__ = "sales_rollup_hourly"
+
+    store_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    hour = db.Column(db.SmallInteger, primary_key=True)
+    bucket = db.Column(db.String(10), primary_key=True)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
 
 # ----------------- Notifications -----------------
 class Notification(db.Model):
@@ -390,6 +459,56 @@ class Notification(db.Model):
     is_read = db.Column(db.Boolean, default=False)
 
 
+# ----------------- Outbox -----------------
+class OutboxEvent(db.Model):
+    """Post-commit side effect, written in the same transaction as the change that caused it."""
+    __tablename__ = "outbox_event"
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(40), nullable=False)
+    payload = db.Column(db.JSON, nullable=False, default=dict)
+    status = db.Column(db.String(20), nullable=False, default="pending", index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    available_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+# ----------------- SMS -----------------
+class SmsMessage(db.Model):
+    """One outgoing text and its delivery state (queued, sending, sent, failed)."""
+    __tablename__ = "sms_message"
+
+    id = db.Column(db.Integer, primary_key=True)
+    to = db.Column(db.String(20), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default="queued", index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    provider_sid = db.Column(db.String(64))
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+
+# ----------------- Account directory -----------------
+class AccountDirectory(db.Model):
+    """email -> account row across all login tables, kept in sync by utils.accounts."""
+    __tablename__ = "account_directory"
+    __table_args__ = (
+        db.UniqueConstraint("account_table", "account_id"),
+        db.Index("ix_account_directory_email_priority", "email", "priority"),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(120), nullable=False)
+    account_table = db.Column(db.String(40), nullable=False)
+    account_id = db.Column(db.Integer, nullable=False)
+    role = db.Column(db.String(20), nullable=False)
+    password = db.Column(db.Text, nullable=False)
+    # lower wins when the same email exists in several tables
+    priority = db.Column(db.SmallInteger, nullable=False, default=0)
+
+
 # ----------------- Staff -----------------
 class Staff(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -449,6 +568,22 @@ class Category(db.Model):
 
 
 # ----------------- Coupon -----------------
+def _redeem_coupon(model, coupon_id):
+    # UPDATE ... SET current_uses = current_uses + 1
+    # WHERE id = ? AND (max_uses = 0 OR current_uses < max_uses)
+    result = db.session.execute(
+        db.update(model)
+        .where(model.id == coupon_id)
+        .where(db.or_(
+            db.func.coalesce(model.max_uses, 0) == 0,
+            db.func.coalesce(model.current_uses, 0) < model.max_uses,
+        ))
+        .values(current_uses=db.func.coalesce(model.current_uses, 0) + 1)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
 class Coupon(db.Model):
     """Store-specific coupon codes."""
     __tablename__ = "coupon"
@@ -500,10 +635,12 @@ class Coupon(db.Model):
         else:  # fixed
             return min(self.discount_value, order_amount)
 
-    def use(self):
-        """Increment usage counter."""
-        self.current_uses = (self.current_uses or 0) + 1
-        db.session.commit()
+    def redeem(self):
+        """
+        Claim one use with a single conditional UPDATE inside the caller's
+        transaction. Returns False when the coupon is already exhausted.
+        """
+        return _redeem_coupon(Coupon, self.id)
 
 
 # ----------------- Ambassador -----------------
@@ -596,9 +733,8 @@ class AmbassadorCoupon(db.Model):
             return round(order_amount * (self.discount_value / 100), 2)
         return min(self.discount_value, order_amount)
 
-    def use(self):
-        self.current_uses = (self.current_uses or 0) + 1
-        db.session.commit()
+    def redeem(self):
+        return _redeem_coupon(AmbassadorCoupon, self.id)
 
 
 # ----------------- Points Redemption -----------------
@@ -172,7 +172,10 @@ document.addEventListener('DOMContentLoaded', function() {
 
       fetch('/add_to_cart_ajax', {
         method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
+        headers: {
+          'Content-Type': 'application/json',
+          'Idempotency-Key': (window.crypto && crypto.randomUUID) ? crypto.randomUUID() : String(Date.now()) + Math.random()
+        },
         body: JSON.stringify({ product_id: productId })
       }).then(function(r) { return r.json(); }).then(function(data) {
         if (data.success) {
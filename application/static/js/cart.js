@@ -141,6 +141,12 @@
   }
   bindRemoveButtons();
 
+  // One key per user action so network retries are not applied twice
+  function newIdempotencyKey() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return String(Date.now()) + Math.random().toString(16).slice(2);
+  }
+
   // Attach to add-to-cart buttons (if any on page)
   function bindAddToCartButtons() {
     document.querySelectorAll('.add-to-cart-btn').forEach(btn => {
@@ -151,7 +157,8 @@
           method: 'POST',
           headers: {
             'Content-Type':'application/json',
-            'X-Requested-With': 'XMLHttpRequest'
+            'X-Requested-With': 'XMLHttpRequest',
+            'Idempotency-Key': newIdempotencyKey()
           },
           body: JSON.stringify({ product_id: productId })
         })
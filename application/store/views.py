@@ -8,8 +8,7 @@ from PIL import Image
 from flask import current_app, jsonify # type: ignore
 from flask import render_template, redirect, url_for, session, request, flash
 from flask_wtf.csrf import generate_csrf
-from flask_bcrypt import Bcrypt
-from flask_login import login_required, current_user, logout_user, LoginManager # type: ignore
+from flask_login import login_required, current_user, logout_user # type: ignore
 from sqlalchemy import func, extract, case,and_
 from sqlalchemy.exc import IntegrityError
 
@@ -25,21 +24,23 @@ from ..forms import addmore, removefromcart, ProductForm, \
     updatestatusform, update, CartlistForm, Search, addstaffform, Set_StoreForm, UpdateStoreForm, updateorderpickup, deliveryregistrationform
 from ..models import (User, Product, Sales, DeliveryGuy,
                       Order, Cart, OrderItem, db, Store,
-                      Notification, Staff, Administrater, Category, Coupon, PointsRedemption)
-from ..utils.notification import create_notification
+                      Notification, Staff, Administrater, Category, Coupon, PointsRedemption,
+                      SalesRollupDaily, SalesRollupProduct)
 from application import cache
 from datetime import datetime as dt_datetime
 from datetime import datetime
-from application.notification import notify_customer, notify_delivery
-from application.auth.views import send_sound
 from application.models import Ingredient
 from application.forms import IngredientForm, StoreLocationForm
+from application.utils.outbox import enqueue
+from application.utils.notification import store_drivers_room
 from application.utils.sms import send_sms
+from application.utils.catalog import catalog_snapshot, page_etag, conditional_page
+from application.utils.passwords import hash_password
+from application.utils.rollups import BUCKET_SETTLED, BUCKET_CANCELLED
+from application.utils.analytics import vendor_window_analytics, window_customer_orders
 
 mystore_product = Store.products
 mystore_orders = Store.orders
-bcrypt = Bcrypt()
-
 
 
 def ai_enhance_and_upload(file, folder='products'):
@@ -182,10 +183,6 @@ def save_product_picture(file):
         return None
 
 
-login_manager = LoginManager()
-login_manager.session_protection = 'strong'
-login_manager.login_view = 'auth.newlogin'
-
 def get_stores(district_id, town_id):
     return Store.query.filter(
         Store.is_active == True,
@@ -199,26 +196,6 @@ def get_stores(district_id, town_id):
 
 
 
-@login_manager.user_loader
-def load_user(user_id):
-    user_type = session.get('user_type')
-    if user_type == 'store':
-        if Store.query.get(int(user_id)):
-            return Store.query.get(int(user_id))
-        else:
-            return Staff.query.get(int(user_id))
-    elif user_type == 'customer':
-        return User.query.get(int(user_id))
-    elif user_type == 'delivery_guy':
-        return DeliveryGuy.query.get(int(user_id))
-    elif user_type == 'administrator':
-        return Administrater.query.get(int(user_id))
-    elif user_type == 'ambassador':
-        return Ambassador.query.get(int(user_id))
-    return None
-
-
-
 @store.route('/dashboard/adminpage', methods=["POST", "GET"])
 @login_required
 def adminpage():
@@ -250,49 +227,22 @@ def adminpage():
     start_of_year = today.replace(month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
     end_of_year = today.replace(month=12, day=31, hour=23, minute=59, second=59, microsecond=999999)
 
-    # ------------------ NET Sales (after 10% commission, exclude cancelled orders) ------------------
+    # ------------------ Sales of settled orders (see utils.rollups.SETTLED_STATUSES) ------------------
     COMMISSION_RATE = 0.10
     NET_MULTIPLIER = 1 - COMMISSION_RATE
-    VALID_ORDER_STATUSES = ["Completed", "Delivered", "Out for Delivery", "Collected"]
-
-    sales_totals = db.session.query(
-        func.sum(
-            case(
-                (
-                    (func.date(Sales.date_) == today.date()) &
-                    (Order.status.in_(VALID_ORDER_STATUSES)),
-                    (Sales.price * Sales.quantity)
-                ),
-                else_=0
-            )
-        ).label('daily'),
-
-        func.sum(
-            case(
-                (
-                    (Sales.date_ >= start_of_month) &
-                    (Sales.date_ <= end_of_month) &
-                    (Order.status.in_(VALID_ORDER_STATUSES)),
-                    (Sales.price * Sales.quantity)
-                ),
-                else_=0
-            )
-        ).label('monthly'),
-
-        func.sum(
-            case(
-                (
-                    (Sales.date_ >= start_of_year) &
-                    (Sales.date_ <= end_of_year) &
-                    (Order.status.in_(VALID_ORDER_STATUSES)),
-                    (Sales.price * Sales.quantity) 
-                ),
-                else_=0
-            )
-        ).label('annual')
-    ).join(Order, Order.id == Sales.order_id)\
-     .filter(Sales.store_id == store_id)\
-     .first()
+
+    settled = db.session.query(SalesRollupDaily).filter(
+        SalesRollupDaily.store_id == store_id,
+        SalesRollupDaily.bucket == BUCKET_SETTLED
+    )
+    sales_totals = settled.with_entities(
+        func.sum(case((SalesRollupDaily.day == today.date(), SalesRollupDaily.revenue), else_=0)).label('daily'),
+        func.sum(case((SalesRollupDaily.day >= start_of_month.date(), SalesRollupDaily.revenue), else_=0)).label('monthly'),
+        func.sum(SalesRollupDaily.revenue).label('annual')
+    ).filter(
+        SalesRollupDaily.day >= start_of_year.date(),
+        SalesRollupDaily.day <= end_of_year.date()
+    ).first()
 
     total_daily_sales = float(sales_totals.daily or 0)
     total_monthly_sales = float(sales_totals.monthly or 0)
@@ -307,27 +257,20 @@ def adminpage():
     ).count()
 
     # ------------------ Daily NET Sales Chart ------------------
-    daily_dates = []
-    daily_totals = []
-
-    current_day = start_of_month
-    while current_day <= today:
-        next_day = current_day + timedelta(days=1)
-
-        total = db.session.query(
-            func.sum((Sales.price * Sales.quantity) * NET_MULTIPLIER)
-        ).join(Order, Order.id == Sales.order_id)\
-         .filter(
-            Sales.store_id == store_id,
-            Sales.date_ >= current_day,
-            Sales.date_ < next_day,
-            Order.status.in_(VALID_ORDER_STATUSES)
-         ).scalar() or 0
-
-        daily_dates.append(current_day.strftime("%Y-%m-%d"))
-        daily_totals.append(float(total))
+    daily_rows = settled.with_entities(
+        SalesRollupDaily.day,
+        SalesRollupDaily.revenue * NET_MULTIPLIER
+    ).filter(
+        SalesRollupDaily.day >= start_of_month.date(),
+        SalesRollupDaily.day <= today.date()
+    ).all()
+    totals_by_day = {day.strftime("%Y-%m-%d"): float(total or 0) for day, total in daily_rows}
 
-        current_day = next_day
+    daily_dates = [
+        (start_of_month + timedelta(days=i)).strftime("%Y-%m-%d")
+        for i in range(today.day)
+    ]
+    daily_totals = [totals_by_day.get(day, 0.0) for day in daily_dates]
 
     daily_data = {"dates": daily_dates, "totals": daily_totals}
 
@@ -644,72 +587,45 @@ def updatestatus(order_id):
 
         order.status = new_status
 
-        try:
-            db.session.commit()
-            # 🔔 Notifications
-            message = f"Order #{order.order_id} status changed from {old_status} to {new_status}"
-            
-            # Notify customer
-            create_notification(user_type='customer', user_id=order.user_id, message=message)
-            try:
-                notify_customer(order.user_id)
-                send_sound(order.user_id, "order_update")
-            except Exception:
-                current_app.logger.debug("notify_customer failed.")
-            
-            # Notify store dashboard
-            create_notification(user_type='store', user_id=order.store_id, message=message)
-            try:
-                send_sound(order.store_id, "order_update")
-            except Exception:
-                pass
+        # 🔔 Side effects go through the outbox so they commit with the status change
+        message = f"Order #{order.order_id} status changed from {old_status} to {new_status}"
+        old_key, new_key = old_status.strip().lower(), new_status.strip().lower()
+
+        # Notify customer
+        enqueue("notification", user_type='customer', user_id=order.user_id, message=message)
+        enqueue("emit", event="play_sound", data={"sound": "order_update"}, room=str(order.user_id))
+
+        # Notify store dashboard
+        enqueue("notification", user_type='store', user_id=order.store_id, message=message)
+        enqueue("emit", event="play_sound", data={"sound": "order_update"}, room=str(order.store_id))
 
-            # Award loyalty points when order is completed/delivered/collected
-            if new_status.strip().lower() in ("delivered", "collected", "completed"):
-                if old_status.strip().lower() not in ("delivered", "collected", "completed"):
-                    try:
-                        from application.main.views import award_loyalty_points
-                        user = User.query.get(order.user_id)
-                        if user:
-                            # Calculate total spent on this order
-                            total_spent = sum(
-                                item.product_price * item.quantity 
-                                for item in order.order_items
-                            ) + (order.deliveryfee or 0)
-                            # Subtract any discounts
-                            total_spent -= (order.coupon_discount or 0) + (order.points_discount or 0)
-                            if total_spent > 0:
-                                award_loyalty_points(user, order, total_spent)
-                    except Exception as e:
-                        current_app.logger.error(f"Failed to award loyalty points: {e}")
-
-            if new_status.strip().lower() == "ready" and old_status.strip().lower() != "ready":
-                sms_body = (
-                    f"SmartEats: Your order {order.order_id} from {order.store.name} "
-                    "is ready. Please collect it or wait for delivery pickup."
+        # Award loyalty points when order is completed/delivered/collected
+        if new_key in ("delivered", "collected", "completed") and old_key not in ("delivered", "collected", "completed"):
+            enqueue("loyalty", order_id=order.id)
+
+        if new_key == "ready" and old_key != "ready":
+            sms_body = (
+                f"SmartEats: Your order {order.order_id} from {order.store.name} "
+                "is ready. Please collect it or wait for delivery pickup."
+            )
+            send_sms(order.customer_phone, sms_body)
+
+            # Notify ALL delivery guys assigned to this store: one bulk insert, one room emit
+            driver_ids = [d_id for (d_id,) in db.session.query(DeliveryGuy.id).filter_by(store_id=order.store_id)]
+            if driver_ids:
+                enqueue(
+                    "notification_bulk",
+                    user_type='delivery_guy',
+                    user_ids=driver_ids,
+                    message=f"New ready order #{order.order_id} from {order.store.name}"
                 )
-                send_sms(order.customer_phone, sms_body)
-                
-                # Notify ALL delivery guys assigned to this store
-                delivery_guys = DeliveryGuy.query.filter_by(store_id=order.store_id).all()
-                for d_guy in delivery_guys:
-                    try:
-                        notify_delivery(d_guy.id)
-                        send_sound(d_guy.id, "order_ready")
-                        create_notification(
-                            user_type='delivery_guy',
-                            user_id=d_guy.id,
-                            message=f"New ready order #{order.order_id} from {order.store.name}"
-                        )
-                    except Exception:
-                        current_app.logger.debug(f"notify_delivery failed for {d_guy.id}")
-            
-            if new_status.strip().lower() == "approved" and old_status.strip().lower() != "approved":
-                try:
-                    send_sound(order.store_id, "new_order")
-                except Exception:
-                    pass
+                enqueue("emit", event="play_sound", data={"sound": "order_ready"}, room=store_drivers_room(order.store_id))
+
+        if new_key == "approved" and old_key != "approved":
+            enqueue("emit", event="play_sound", data={"sound": "new_order"}, room=str(order.store_id))
 
+        try:
+            db.session.commit()
             flash('Order status updated successfully')
             return redirect(url_for('store.ActiveOrders'))
 
@@ -880,7 +796,7 @@ def addstaff():
         user_type='store', user_id=store.id, is_read=False
     ).order_by(Notification.timestamp.desc()).count()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = hash_password(form.password.data)
         newstuff = Staff(names=form.names.data, email=form.email.data, role=form.role.data, password=hashed_password,
                          store=store)
         if newstuff:
@@ -906,7 +822,7 @@ def register_delivery():
     store = Store.query.get_or_404(store_id)
     
     if request.method == "POST":
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_password = hash_password(form.password.data)
         new_delivery = DeliveryGuy(
             names=form.names.data,
             email=form.email.data,
@@ -948,148 +864,40 @@ def vendor_analytics():
     prev_start = start_date - timedelta(days=period_length)
     prev_end = start_date
 
-    # ------------------ Base NET Expression ------------------
-    net_amount = (Sales.price * Sales.quantity) * (1 - COMMISSION_RATE)
-
-    base_filter = [
-        Sales.store_id == store_id,
-        Order.status != "Cancelled"
-    ]
+    NET_MULTIPLIER = 1 - COMMISSION_RATE
 
-    # ------------------ Sales ------------------
-    def sales_query(start, end):
-        return (
-            db.session.query(func.sum(net_amount))
-            .join(Order, Order.id == Sales.order_id)
-            .filter(*base_filter)
-            .filter(func.date(Sales.date_).between(start, end))
-            .scalar() or 0
-        )
+    # ------------------ Windowed metrics (sales rollups, utils.analytics) ------------------
+    window = vendor_window_analytics(store_id, start_date, end_date, prev_start, prev_end, NET_MULTIPLIER)
 
-    total_sales = sales_query(start_date, end_date)
-    prev_sales = sales_query(prev_start, prev_end)
+    total_sales = window["total_sales"]
+    prev_sales = window["prev_sales"]
     sales_change = round(((total_sales - prev_sales) / prev_sales * 100), 2) if prev_sales else 100
 
-    # ------------------ Orders & AOV ------------------
-    total_orders = (
-        db.session.query(func.count(Sales.order_id.distinct()))
-        .join(Order, Order.id == Sales.order_id)
-        .filter(*base_filter)
-        .filter(func.date(Sales.date_).between(start_date, end_date))
-        .scalar() or 1
-    )
-
+    total_orders = window["total_orders"] or 1
     avg_order_value = total_sales / total_orders
 
-    prev_orders = (
-        db.session.query(func.count(Sales.order_id.distinct()))
-        .join(Order, Order.id == Sales.order_id)
-        .filter(*base_filter)
-        .filter(func.date(Sales.date_).between(prev_start, prev_end))
-        .scalar() or 1
-    )
-
+    prev_orders = window["prev_orders"] or 1
     prev_aov = prev_sales / prev_orders if prev_orders else 0
     aov_change = round(((avg_order_value - prev_aov) / prev_aov * 100), 2) if prev_aov else 100
 
-    # ------------------ Sales Trend ------------------
-    sales_trend = (
-        db.session.query(func.date(Sales.date_), func.sum(net_amount))
-        .join(Order, Order.id == Sales.order_id)
-        .filter(*base_filter)
-        .filter(func.date(Sales.date_).between(start_date, end_date))
-        .group_by(func.date(Sales.date_))
-        .order_by(func.date(Sales.date_))
-        .all()
-    )
-
-    dates, revenues = zip(*sales_trend) if sales_trend else ([], [])
-    dates = [d.strftime('%Y-%m-%d') for d in dates]
-
-    # ------------------ Product Sales ------------------
-    product_sales = (
-        db.session.query(Product.productname, func.sum(net_amount))
-        .join(Sales, Sales.product_id == Product.id)
-        .join(Order, Order.id == Sales.order_id)
-        .filter(*base_filter)
-        .filter(func.date(Sales.date_).between(start_date, end_date))
-        .group_by(Product.productname)
-        .order_by(func.sum(net_amount).desc())
-        .limit(5)
-        .all()
-    )
-
-    prod_names, prod_revenues = zip(*product_sales) if product_sales else ([], [])
-
-    # ------------------ Category Sales ------------------
-    category_sales = (
-    db.session.query(
-        Category.name,
-        func.sum(
-            Sales.price * Sales.quantity * 0.9
-        ).label("revenue")
-    )
-    .select_from(Sales)
-    .join(Product, Product.id == Sales.product_id)
-    .join(Category, Category.id == Product.category_id)
-    .join(Order, Order.id == Sales.order_id)
-    .filter(Sales.store_id == current_user.id)
-    .filter(Order.status != "Cancelled")
-    .filter(func.date(Sales.date_).between(start_date, end_date))
-    .group_by(Category.id, Category.name)
-    .all()
-)
-
-    categories, cat_revenue = zip(*category_sales) if category_sales else ([], [])
-
-    # ------------------ Top Customers ------------------
-    top_customers = (
-        db.session.query(User.username, func.sum(net_amount).label("spent"))
-        .join(Sales, Sales.user_id == User.id)
-        .join(Order, Order.id == Sales.order_id)
-        .filter(*base_filter)
-        .filter(func.date(Sales.date_).between(start_date, end_date))
-        .group_by(User.username)
-        .order_by(func.sum(net_amount).desc())
-        .limit(5)
-        .all()
-    )
-
-    # ------------------ Hourly Sales ------------------
-    hourly_sales = (
-        db.session.query(func.extract('hour', Sales.date_), func.sum(net_amount))
-        .join(Order, Order.id == Sales.order_id)
-        .filter(*base_filter)
-        .filter(func.date(Sales.date_).between(start_date, end_date))
-        .group_by(func.extract('hour', Sales.date_))
-        .order_by(func.extract('hour', Sales.date_))
-        .all()
-    )
-
-    hours, hourly_revenue = zip(*hourly_sales) if hourly_sales else ([], [])
-
-    # ------------------ Weekday Sales ------------------
-    weekday_sales = (
-        db.session.query(func.extract('dow', Sales.date_), func.sum(net_amount))
-        .join(Order, Order.id == Sales.order_id)
-        .filter(*base_filter)
-        .filter(func.date(Sales.date_).between(start_date, end_date))
-        .group_by(func.extract('dow', Sales.date_))
-        .order_by(func.extract('dow', Sales.date_))
-        .all()
-    )
+    dates, revenues = window["dates"], window["revenues"]
+    prod_names, prod_revenues = window["prod_names"], window["prod_revenues"]
+    categories, cat_revenue = window["categories"], window["cat_revenue"]
+    top_customers = window["top_customers"]
+    hours, hourly_revenue = window["hours"], window["hourly_revenue"]
+    weekdays, weekday_revenue = window["weekdays"], window["weekday_revenue"]
 
-    weekday_names = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-    weekdays, weekday_revenue = zip(*weekday_sales) if weekday_sales else ([], [])
-    weekdays = [weekday_names[int(d)] for d in weekdays]
+    # All-time totals below come from the sales rollups (utils.rollups)
+    def rollup(model):
+        return [model.store_id == store_id, model.bucket != BUCKET_CANCELLED]
 
     # ------------------ Monthly Sales ------------------
+    month = extract('month', SalesRollupDaily.day)
     monthly_sales = (
-        db.session.query(func.extract('month', Sales.date_), func.sum(net_amount))
-        .join(Order, Order.id == Sales.order_id)
-        .filter(*base_filter)
-        .group_by(func.extract('month', Sales.date_))
-        .order_by(func.extract('month', Sales.date_))
+        db.session.query(month, func.sum(SalesRollupDaily.revenue) * NET_MULTIPLIER)
+        .filter(*rollup(SalesRollupDaily))
+        .group_by(month)
+        .order_by(month)
         .all()
     )
 
@@ -1097,9 +905,8 @@ def vendor_analytics():
 
     # ------------------ Inventory & Repeat Customers ------------------
     total_sold = (
-        db.session.query(func.sum(Sales.quantity))
-        .join(Order, Order.id == Sales.order_id)
-        .filter(*base_filter)
+        db.session.query(func.sum(SalesRollupDaily.quantity))
+        .filter(*rollup(SalesRollupDaily))
         .scalar() or 0
     )
 
@@ -1115,34 +922,22 @@ def vendor_analytics():
     avg_daily_sales = total_sold / days
     days_left = round(total_stock / avg_daily_sales, 1) if avg_daily_sales > 0 else "N/A"
 
-    repeat_customers = (
-        db.session.query(User.username, func.count(Sales.order_id.distinct()))
-        .join(Sales, Sales.user_id == User.id)
-        .join(Order, Order.id == Sales.order_id)
-        .filter(*base_filter)
-        .group_by(User.username)
-        .having(func.count(Sales.order_id.distinct()) > 1)
-        .all()
-    )
-
-    total_customers = (
-        db.session.query(func.count(User.id.distinct()))
-        .join(Sales, Sales.user_id == User.id)
-        .join(Order, Order.id == Sales.order_id)
-        .filter(*base_filter)
-        .scalar() or 1
-    )
+    # Repeat customers within the selected window, so the page cost follows the date range
+    customer_orders = window_customer_orders(store_id, start_date, end_date)
+    repeat_customers = [(name, orders) for name, orders in customer_orders if orders > 1]
+    total_customers = len(customer_orders) or 1
 
     repeat_rate = round((len(repeat_customers) / total_customers) * 100, 2)
 
     # ------------------ Product Contribution ------------------
+    product_revenue = func.sum(SalesRollupProduct.revenue) * NET_MULTIPLIER
     product_contribution = (
-        db.session.query(Product.productname, func.sum(net_amount))
-        .join(Sales, Sales.product_id == Product.id)
-        .join(Order, Order.id == Sales.order_id)
-        .filter(*base_filter)
+        db.session.query(Product.productname, product_revenue)
+        .select_from(SalesRollupProduct)
+        .join(Product, Product.id == SalesRollupProduct.product_id)
+        .filter(*rollup(SalesRollupProduct))
         .group_by(Product.productname)
-        .order_by(func.sum(net_amount).desc())
+        .order_by(product_revenue.desc())
         .all()
     )
 
@@ -1216,9 +1011,6 @@ def vendor_pos():
     store_id = session.get('store_id')
     store = Store.query.get_or_404(store_id)
 
-    products = Product.query.filter_by(store_id=store.id, is_active=True).all()
-    categories = Category.query.filter_by(store_id=store.id, is_active=True).all()
-
     if request.method == 'POST':
         try:
             data = request.get_json(force=True)
@@ -1322,14 +1114,20 @@ def vendor_pos():
             db.session.rollback()
             return jsonify({'error': str(e)}), 500
 
-    csrf_token = generate_csrf()
-    return render_template(
-        'store/pos.html',
-        store=store,
-        store_categories=categories,
-        products=products,
-        csrf_token=csrf_token
-    )
+    snapshot = catalog_snapshot(store.id)
+
+    def render():
+        return render_template(
+            'store/pos.html',
+            store=store,
+            store_categories=snapshot["categories"],
+            products=snapshot["products"],
+            csrf_token=generate_csrf()
+        )
+
+    # adminlayout shows the logged-in account's name
+    etag = page_etag(snapshot, "vendor_pos", store.updated_at, getattr(current_user, "name", None))
+    return conditional_page(etag, render)
 
 
 @store.route('/categories', methods=['GET', 'POST'])
@@ -1395,17 +1193,9 @@ def view_categories(category_id):
     store_id = current_user.id  
     store = Store.query.get_or_404(store_id)
 
-    categories = Category.query.filter_by(
-        store_id=store.id,
-        is_active=True,
-        id=category_id
-    ).order_by(Category.name.asc()).all()
-
-    products = Product.query.filter_by(
-        store_id=store.id,
-        category_id=category_id,
-        is_active=True
-    ).order_by(Product.productname.asc()).all()
+    snapshot = catalog_snapshot(store.id)
+    categories = [c for c in snapshot["categories"] if c["id"] == category_id]
+    products = [p for p in snapshot["products"] if p["category_id"] == category_id]
 
     return render_template(
         'store/view_categories.html',
@@ -0,0 +1,85 @@
+from sqlalchemy import delete, event, inspect, insert
+from sqlalchemy.orm import Session
+
+from ..models import db, AccountDirectory, User, Administrater, Ambassador, Store, DeliveryGuy, Staff
+
+# Login tables in lookup order; the index is the directory priority.
+ACCOUNT_MODELS = (
+    (User, "customer"),
+    (Administrater, "administrator"),
+    (Ambassador, "ambassador"),
+    (Store, "store"),
+    (DeliveryGuy, "delivery_guy"),
+    (Staff, "store"),
+)
+_BY_MODEL = {model: (priority, role) for priority, (model, role) in enumerate(ACCOUNT_MODELS)}
+_BY_TABLE = {model.__table__.name: model for model, _ in ACCOUNT_MODELS}
+
+
+def _entry(obj):
+    priority, role = _BY_MODEL[type(obj)]
+    return {
+        "email": obj.email,
+        "account_table": type(obj).__table__.name,
+        "account_id": obj.id,
+        "role": role,
+        "password": obj.password,
+        "priority": priority,
+    }
+
+
+def find_account(email):
+    """Directory entry for the account that owns this email, or None."""
+    return (
+        AccountDirectory.query
+        .filter(AccountDirectory.email == email)
+        .order_by(AccountDirectory.priority.asc())
+        .first()
+    )
+
+
+def load_account(entry):
+    return db.session.get(_BY_TABLE[entry.account_table], entry.account_id)
+
+
+def rebuild_account_directory():
+    """Re-create every directory entry from the account tables."""
+    db.session.execute(delete(AccountDirectory))
+    for model, _ in ACCOUNT_MODELS:
+        rows = [_entry(obj) for obj in model.query.all()]
+        if rows:
+            db.session.execute(insert(AccountDirectory), rows)
+    db.session.commit()
+
+
+# ----------------- Sync -----------------
+@event.listens_for(Session, "after_flush")
+def _sync_account_directory(session, flush_context):
+    """Mirror account inserts, deletes and email/password changes in the same transaction."""
+    removed, added = [], []
+    for obj in session.new:
+        if type(obj) in _BY_MODEL:
+            added.append(obj)
+    for obj in session.deleted:
+        if type(obj) in _BY_MODEL:
+            removed.append(obj)
+    for obj in session.dirty:
+        if type(obj) in _BY_MODEL:
+            state = inspect(obj)
+            if state.attrs.email.history.has_changes() or state.attrs.password.history.has_changes():
+                removed.append(obj)
+                added.append(obj)
+
+    if not (removed or added):
+        return
+    table = AccountDirectory.__table__
+    conn = session.connection()
+    for obj in removed:
+        conn.execute(
+            delete(table).where(
+                table.c.account_table == type(obj).__table__.name,
+                table.c.account_id == obj.id,
+            )
+        )
+    if added:
+        conn.execute(insert(table), [_entry(obj) for obj in added])
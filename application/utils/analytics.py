@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+
+from ..models import (db, Sales, Order, Product, Category, User,
+                      SalesRollupDaily, SalesRollupHourly, SalesRollupProduct)
+from .rollups import BUCKET_CANCELLED
+
+WEEKDAY_NAMES = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+
+def _day_start(day):
+    return datetime.combine(day, datetime.min.time())
+
+
+def rollup_frame(model, store_id, start, end, key):
+    """
+    Non-cancelled rollup totals of one store from start to end (inclusive
+    days), summed per key column in one query.
+    """
+    column = getattr(model, key)
+    result = db.session.execute(
+        select(column, func.sum(model.revenue), func.sum(model.orders))
+        .where(
+            model.store_id == store_id,
+            model.bucket != BUCKET_CANCELLED,
+            model.day >= start,
+            model.day <= end,
+        )
+        .group_by(column)
+    )
+    frame = pd.DataFrame.from_records(result.all(), columns=[key, "revenue", "orders"])
+    return frame.astype({"revenue": np.float64, "orders": np.int64}).set_index(key).sort_index()
+
+
+def window_metrics(daily, hourly, start, end, prev_start, prev_end, net_multiplier):
+    """
+    Windowed totals, trend, hourly and weekday figures from the per-day and
+    per-hour rollup frames, using vectorized slices and group-bys.
+    """
+    days = pd.to_datetime(daily.index)
+    current = daily.loc[(days >= pd.Timestamp(start)) & (days <= pd.Timestamp(end))]
+    previous = daily.loc[(days >= pd.Timestamp(prev_start)) & (days <= pd.Timestamp(prev_end))]
+    trend = current["revenue"] * net_multiplier
+    trend.index = pd.to_datetime(trend.index)
+    return {
+        "total_sales": float(trend.sum()),
+        "prev_sales": float(previous["revenue"].sum() * net_multiplier),
+        "total_orders": int(current["orders"].sum()),
+        "prev_orders": int(previous["orders"].sum()),
+        "trend": trend,
+        "hourly": hourly["revenue"] * net_multiplier,
+        # 0 = Sunday, matching SQL's dow
+        "weekday": trend.groupby((trend.index.dayofweek + 1) % 7).sum().sort_index(),
+    }
+
+
+def _products(product_ids):
+    rows = db.session.execute(
+        select(Product.id, Product.productname, Category.name)
+        .outerjoin(Category, Category.id == Product.category_id)
+        .where(Product.id.in_(product_ids))
+    ).all()
+    return pd.DataFrame.from_records(rows, columns=["product_id", "productname", "category"]).set_index("product_id")
+
+
+def top_customers(store_id, start, end, net_multiplier, top=5):
+    """Biggest spenders in the window; the one figure the rollups cannot answer."""
+    spent = func.sum(Sales.price * Sales.quantity) * net_multiplier
+    return [
+        (username, total) for username, total in db.session.execute(
+            select(User.username, spent)
+            .join(Sales, Sales.user_id == User.id)
+            .join(Order, Order.id == Sales.order_id)
+            .where(
+                Sales.store_id == store_id,
+                Order.status != "Cancelled",
+                Sales.date_ >= _day_start(start),
+                Sales.date_ < _day_start(end + timedelta(days=1)),
+            )
+            .group_by(User.username)
+            .order_by(spent.desc())
+            .limit(top)
+        ).all()
+    ]
+
+
+def window_customer_orders(store_id, start, end):
+    """(username, non-cancelled orders) for every customer who ordered in the window."""
+    return db.session.execute(
+        select(User.username, func.count(Sales.order_id.distinct()))
+        .join(Sales, Sales.user_id == User.id)
+        .join(Order, Order.id == Sales.order_id)
+        .where(
+            Sales.store_id == store_id,
+            Order.status != "Cancelled",
+            Sales.date_ >= _day_start(start),
+            Sales.date_ < _day_start(end + timedelta(days=1)),
+        )
+        .group_by(User.username)
+    ).all()
+
+
+def vendor_window_analytics(store_id, start, end, prev_start, prev_end, net_multiplier, top=5):
+    """Windowed vendor_analytics figures, shaped for the template."""
+    first, last = min(start, prev_start), max(end, prev_end)
+    daily = rollup_frame(SalesRollupDaily, store_id, first, last, "day")
+    hourly = rollup_frame(SalesRollupHourly, store_id, start, end, "hour")
+    metrics = window_metrics(daily, hourly, start, end, prev_start, prev_end, net_multiplier)
+
+    by_product = rollup_frame(SalesRollupProduct, store_id, start, end, "product_id")["revenue"] * net_multiplier
+    if len(by_product):
+        by_product = by_product.to_frame().join(_products(by_product.index.tolist()), how="inner")
+        product_sales = by_product.groupby("productname")["revenue"].sum().nlargest(top)
+        category_sales = by_product.dropna(subset=["category"]).groupby("category")["revenue"].sum()
+    else:
+        product_sales = category_sales = pd.Series(dtype=np.float64)
+
+    trend, hourly, weekday = metrics["trend"], metrics["hourly"], metrics["weekday"]
+    return {
+        "total_sales": metrics["total_sales"],
+        "prev_sales": metrics["prev_sales"],
+        "total_orders": metrics["total_orders"],
+        "prev_orders": metrics["prev_orders"],
+        "dates": [d.strftime('%Y-%m-%d') for d in trend.index],
+        "revenues": trend.tolist(),
+        "hours": [int(h) for h in hourly.index],
+        "hourly_revenue": hourly.tolist(),
+        "weekdays": [WEEKDAY_NAMES[int(d)] for d in weekday.index],
+        "weekday_revenue": weekday.tolist(),
+        "prod_names": product_sales.index.tolist(),
+        "prod_revenues": product_sales.tolist(),
+        "categories": category_sales.index.tolist(),
+        "cat_revenue": category_sales.tolist(),
+        "top_customers": top_customers(store_id, start, end, net_multiplier, top),
+    }
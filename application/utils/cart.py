@@ -0,0 +1,136 @@
+from collections import namedtuple
+
+from sqlalchemy import func
+
+from ..models import db, Cart, CartItem, Product, CustomMeal, Coupon, AmbassadorCoupon
+from .cache import cart_cache
+from .changes import watch
+
+
+CartSummary = namedtuple(
+    "CartSummary",
+    ["cart_id", "count", "subtotal", "discount", "grand_total", "coupon", "coupon_source"],
+)
+
+EMPTY_CART = CartSummary(None, 0, 0.0, 0.0, 0.0, None, None)
+
+
+def _line_price():
+    # Same precedence as CartItem.get_price(): product first, then custom meal.
+    return func.coalesce(Product.price, CustomMeal.total_price, 0)
+
+
+def cart_summary(user_id, store_id):
+    """
+    Return count, subtotal, discount and grand total for the (user, store) cart
+    using one aggregate query instead of walking cart.cart_items.
+    """
+    if not user_id or not store_id:
+        return EMPTY_CART
+
+    row = (
+        db.session.query(
+            Cart.id,
+            Cart.coupon_id,
+            Cart.ambassador_coupon_id,
+            func.coalesce(func.sum(CartItem.quantity), 0),
+            func.coalesce(func.sum(CartItem.quantity * _line_price()), 0.0),
+        )
+        .outerjoin(CartItem, CartItem.cart_id == Cart.id)
+        .outerjoin(Product, Product.id == CartItem.product_id)
+        .outerjoin(CustomMeal, CustomMeal.id == CartItem.custom_meal_id)
+        .filter(Cart.user_id == user_id, Cart.store_id == store_id)
+        .group_by(Cart.id, Cart.coupon_id, Cart.ambassador_coupon_id)
+        .first()
+    )
+    if not row:
+        return EMPTY_CART
+
+    cart_id, coupon_id, ambassador_coupon_id, count, subtotal = row
+    count = int(count or 0)
+    subtotal = float(subtotal or 0)
+
+    # Mirrors Cart.get_discount(): ambassador coupon wins over a store coupon.
+    coupon, coupon_source = None, None
+    if ambassador_coupon_id:
+        coupon = db.session.get(AmbassadorCoupon, ambassador_coupon_id)
+        coupon_source = "ambassador" if coupon else None
+    if not coupon and coupon_id:
+        coupon = db.session.get(Coupon, coupon_id)
+        coupon_source = "store" if coupon else None
+
+    discount = coupon.calculate_discount(subtotal) if coupon else 0.0
+
+    return CartSummary(
+        cart_id=cart_id,
+        count=count,
+        subtotal=subtotal,
+        discount=discount,
+        grand_total=max(subtotal - discount, 0),
+        coupon=coupon,
+        coupon_source=coupon_source,
+    )
+
+
+# ----------------- Cart read model -----------------
+# Serialized (user, store) cart views kept in utils.cache.cart_cache. Every
+# cart mutation writes the fresh view through, so the cart badge and
+# cart_status are served from memory without touching the database. A
+# committed product price change evicts every cached view of that store, so
+# the next read reprices the cart.
+#
+# The cache lives in process memory, which assumes the single server process
+# Flask-SocketIO already needs (it runs without a message queue). Serving
+# from several workers would need this moved to a shared store.
+
+def _serialize(summary):
+    return {
+        "cart_id": summary.cart_id,
+        "count": summary.count,
+        "subtotal": round(summary.subtotal, 2),
+        "discount": round(summary.discount, 2),
+        "grand_total": round(summary.grand_total, 2),
+        "coupon_code": summary.coupon.code if summary.coupon else None,
+        "coupon_source": summary.coupon_source,
+    }
+
+
+EMPTY_CART_VIEW = _serialize(EMPTY_CART)
+
+
+def refresh_cart_view(user_id, store_id):
+    """Recompute the cart view from the database and write it to the cache."""
+    if not user_id or not store_id:
+        return dict(EMPTY_CART_VIEW)
+    view = _serialize(cart_summary(user_id, store_id))
+    cart_cache.set(user_id, int(store_id), view)
+    return dict(view)
+
+
+def cart_view(user_id, store_id):
+    """Return the cached cart view, loading it once on a cache miss."""
+    if not user_id or not store_id:
+        return dict(EMPTY_CART_VIEW)
+    view = cart_cache.get(user_id, int(store_id))
+    if view is None:
+        return refresh_cart_view(user_id, store_id)
+    return dict(view)
+
+
+def invalidate_cart_view(user_id, store_id=None):
+    if store_id is None:
+        cart_cache.clear_cache(user_id)
+    else:
+        cart_cache.remove(user_id, int(store_id))
+
+
+# ----------------- Invalidation -----------------
+def _evict_repriced_stores(store_ids):
+    """Drop every user's cached view of the stores whose prices changed."""
+    for user_id, views in list(cart_cache.store.items()):
+        for store_id in store_ids:
+            if store_id in views:
+                cart_cache.remove(user_id, store_id)
+
+
+watch("cart_prices", {Product: ("price",)}, on_commit=_evict_repriced_stores, key=lambda product: product.store_id)
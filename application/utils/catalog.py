@@ -0,0 +1,165 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import inspect, update
+
+from ..models import db, Store, Product, Category
+from .changes import watch
+
+# Columns that end up in the snapshot. Stock level changes on every order
+# and is deliberately left out so it does not invalidate browser caches.
+PRODUCT_FIELDS = ("id", "productname", "price", "pictures", "description", "category_id")
+CATEGORY_FIELDS = ("id", "name")
+
+_TRACKED = {
+    Product: ("productname", "price", "pictures", "description", "category_id", "is_active", "store_id"),
+    Category: ("name", "is_active", "store_id"),
+}
+
+_snapshots = OrderedDict()
+_lock = threading.Lock()
+
+_templates_digest = None
+
+
+# ----------------- Versioning -----------------
+def _bump_catalog_versions(session, objects):
+    """Bump Store.catalog_version in the same transaction as the catalog change."""
+    store_ids = set()
+    for obj in objects:
+        store_ids.add(obj.store_id)
+        # A product moved to another store changes both catalogs.
+        store_ids.update(inspect(obj).attrs.store_id.history.deleted)
+    store_ids.discard(None)
+
+    if store_ids:
+        store = Store.__table__
+        session.connection().execute(
+            update(store)
+            .where(store.c.id.in_(store_ids))
+            .values(catalog_version=store.c.catalog_version + 1)
+        )
+
+
+watch("catalog", _TRACKED, on_flush=_bump_catalog_versions)
+
+
+def catalog_version(store_id):
+    return db.session.query(Store.catalog_version).filter(Store.id == store_id).scalar()
+
+
+# ----------------- Snapshots -----------------
+def _build_snapshot(store_id, version):
+    categories = (
+        db.session.query(*[getattr(Category, f) for f in CATEGORY_FIELDS])
+        .filter(Category.store_id == store_id, Category.is_active.is_(True))
+        .order_by(Category.name.asc())
+        .all()
+    )
+    products = (
+        db.session.query(*[getattr(Product, f) for f in PRODUCT_FIELDS])
+        .filter(Product.store_id == store_id, Product.is_active.is_(True))
+        .order_by(Product.productname.asc())
+        .all()
+    )
+    snapshot = {
+        "store_id": store_id,
+        "version": version,
+        "categories": [dict(zip(CATEGORY_FIELDS, row)) for row in categories],
+        "products": [dict(zip(PRODUCT_FIELDS, row)) for row in products],
+    }
+    body = json.dumps(snapshot, separators=(",", ":"))
+    snapshot["body"] = body
+    snapshot["etag"] = hashlib.sha1(body.encode()).hexdigest()
+    return snapshot
+
+
+def catalog_snapshot(store_id):
+    """
+    Return the store's active categories and products, serialized once per
+    catalog_version. Returns None for an unknown store.
+    """
+    version = catalog_version(store_id)
+    if version is None:
+        return None
+
+    with _lock:
+        cached = _snapshots.get(store_id)
+        if cached and cached["version"] == version:
+            _snapshots.move_to_end(store_id)
+            return cached
+
+    snapshot = _build_snapshot(store_id, version)
+    with _lock:
+        _snapshots[store_id] = snapshot
+        _snapshots.move_to_end(store_id)
+        while len(_snapshots) > current_app.config.get("CATALOG_CACHE_STORES", 500):
+            _snapshots.popitem(last=False)
+    return snapshot
+
+
+def snapshot_product(snapshot, product_id):
+    return next((p for p in snapshot["products"] if p["id"] == product_id), None)
+
+
+def catalog_response(store_id):
+    """JSON snapshot with a strong ETag; answers 304 when the client's copy is current."""
+    snapshot = catalog_snapshot(store_id)
+    if snapshot is None:
+        return None
+    response = current_app.response_class(snapshot["body"], mimetype="application/json")
+    response.set_etag(snapshot["etag"])
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
+
+
+# ----------------- Conditional pages -----------------
+def templates_digest():
+    """
+    Hash of every template's source. The same on every worker of a deploy,
+    and different after one that changes a template, so a redeploy never
+    answers 304 with a stale layout.
+    """
+    global _templates_digest
+    if _templates_digest is None:
+        env = current_app.jinja_env
+        digest = hashlib.sha1()
+        for name in sorted(env.loader.list_templates()):
+            source = env.loader.get_source(env, name)[0]
+            digest.update(name.encode() + b"\0" + source.encode() + b"\0")
+        _templates_digest = digest.hexdigest()
+    return _templates_digest
+
+
+def page_etag(snapshot, *parts):
+    """
+    Validator for an HTML page rendered from a catalog snapshot, built from
+    data only so every worker agrees on it. parts are whatever else the page
+    and its layout show (store row, cart badge, paging); the logged-in
+    account is always included. The CSRF window keeps a cached copy from
+    outliving its form token.
+    """
+    csrf_window = int(time.time()) // ((current_app.config.get("WTF_CSRF_TIME_LIMIT") or 3600) // 2)
+    account = (session.get("user_type"), current_user.get_id() if current_user.is_authenticated else None)
+    key = repr((templates_digest(), csrf_window, account, snapshot["etag"]) + parts)
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def conditional_page(etag, render):
+    """
+    Answer 304 without calling render() when the client's copy matches etag;
+    pending flash messages always get a fresh render.
+    """
+    if (request.method in ("GET", "HEAD") and "_flashes" not in session
+            and request.if_none_match.contains_weak(etag)):
+        response = current_app.response_class()
+    else:
+        response = make_response(render())
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response.make_conditional(request)
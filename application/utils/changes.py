@@ -0,0 +1,70 @@
+from collections import defaultdict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+# model -> [(watcher name, columns or None)]
+_watchers = defaultdict(list)
+_on_flush = {}
+_on_commit = {}
+_keys = {}
+
+
+def _model_key(obj):
+    return (type(obj), obj.id) if obj.id is not None else None
+
+
+def watch(name, models, on_commit=None, on_flush=None, key=_model_key):
+    """
+    Register a watcher on committed model changes.
+
+    models maps each model to the column names whose change matters, or to
+    None for any change; added and deleted rows always count. After a flush
+    that touched a match, on_flush(session, objects) runs inside the
+    transaction. After the commit, on_commit(keys) runs once with the set of
+    key(obj) values collected since the last commit, (model, id) by default;
+    None values are skipped.
+    """
+    for model, columns in models.items():
+        _watchers[model].append((name, columns))
+    if on_flush is not None:
+        _on_flush[name] = on_flush
+    if on_commit is not None:
+        _on_commit[name] = on_commit
+        _keys[name] = key
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    matched = defaultdict(list)
+    for objects, dirty in ((session.new, False), (session.deleted, False), (session.dirty, True)):
+        for obj in objects:
+            watchers = _watchers.get(type(obj))
+            if not watchers:
+                continue
+            attrs = inspect(obj).attrs if dirty else None
+            for name, columns in watchers:
+                if attrs is not None and columns is not None and not any(
+                    attrs[column].history.has_changes() for column in columns
+                ):
+                    continue
+                matched[name].append(obj)
+
+    for name, objects in matched.items():
+        if name in _on_flush:
+            _on_flush[name](session, objects)
+        if name in _on_commit:
+            keys = session.info.setdefault("changes", {}).setdefault(name, set())
+            keys.update(_keys[name](obj) for obj in objects)
+            keys.discard(None)
+
+
+@event.listens_for(Session, "after_commit")
+def _notify_commit(session):
+    for name, keys in session.info.pop("changes", {}).items():
+        _on_commit[name](keys)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changes(session):
+    session.info.pop("changes", None)
@@ -0,0 +1,38 @@
+import threading
+
+
+class FakeMailBackend:
+    """
+    Local stand-in for SendGrid/SMTP, used when EMAIL_BACKEND is "fake".
+    Accepted messages are kept in `sent` (one entry per recipient) and
+    `requests` counts provider calls; queue failures with fail_next().
+    """
+
+    max_batch = 1000  # as SendGrid
+    sent = []
+    requests = 0
+    _failures = []
+    _lock = threading.Lock()
+
+    @classmethod
+    def fail_next(cls, retryable=True, times=1):
+        with cls._lock:
+            cls._failures.extend([retryable] * times)
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls.sent.clear()
+            cls._failures.clear()
+            cls.requests = 0
+
+    def send(self, messages):
+        from .mail import MailError
+
+        with self._lock:
+            type(self).requests += 1
+            failure = self._failures.pop(0) if self._failures else None
+        if failure is not None:
+            raise MailError("Injected failure", retryable=failure)
+        with self._lock:
+            self.sent.extend(dict(m) for m in messages)
@@ -0,0 +1,69 @@
+import json
+import secrets
+import threading
+from urllib.parse import parse_qs
+
+from requests.adapters import BaseAdapter
+from requests.models import Response
+
+
+class FakeTwilioAdapter(BaseAdapter):
+    """
+    Local stand-in for the Twilio Messages endpoint, mounted on the SMS
+    client's session when SMS_BACKEND is "fake". Accepted messages are kept
+    in `sent`; queue failures with fail_next() to exercise retries.
+    """
+
+    sent = []
+    _failures = []
+    _lock = threading.Lock()
+
+    @classmethod
+    def fail_next(cls, status=500, times=1, retry_after=None):
+        with cls._lock:
+            cls._failures.extend([(status, retry_after)] * times)
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls.sent.clear()
+            cls._failures.clear()
+
+    def send(self, request, **kwargs):
+        with self._lock:
+            failure = self._failures.pop(0) if self._failures else None
+
+        if failure:
+            status, retry_after = failure
+            headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+            return self._response(request, status, {"message": "Injected failure"}, headers)
+
+        body = request.body.decode() if isinstance(request.body, bytes) else (request.body or "")
+        form = {key: values[0] for key, values in parse_qs(body).items()}
+        if not form.get("To") or not form.get("Body"):
+            return self._response(request, 400, {"code": 21604, "message": "'To' and 'Body' are required"})
+
+        message = {
+            "sid": "SM" + secrets.token_hex(16),
+            "to": form["To"],
+            "from": form.get("From"),
+            "body": form["Body"],
+            "status": "queued",
+        }
+        with self._lock:
+            self.sent.append(message)
+        return self._response(request, 201, message)
+
+    def close(self):
+        pass
+
+    def _response(self, request, status, payload, headers=None):
+        response = Response()
+        response.status_code = status
+        response._content = json.dumps(payload).encode()
+        response.headers["Content-Type"] = "application/json"
+        response.headers.update(headers or {})
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        return response
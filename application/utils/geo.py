@@ -0,0 +1,126 @@
+import math
+import threading
+import time
+from collections import defaultdict
+from math import radians, sin, cos, sqrt, atan2
+
+from flask import current_app
+
+from ..models import db, Store
+from .changes import watch
+
+EARTH_RADIUS_M = 6371000
+METERS_PER_DEGREE = 111320
+
+
+def haversine_meters(lat1, lon1, lat2, lon2):
+    """
+    Calculate great-circle distance in meters
+    """
+    R = EARTH_RADIUS_M
+
+    lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
+
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+
+    a = sin(dlat / 2)**2 + cos(lat1) * cos(lat2) * sin(dlon / 2)**2
+    c = 2 * atan2(sqrt(a), sqrt(1 - a))
+
+    return R * c
+
+
+def calculate_delivery_fee(store_lat, store_lng, cust_lat, cust_lng,
+                           store_radius=500,
+                           inside_min_fee=10,
+                           normal_min_fee=13,
+                           rate_per_meter=0.01,
+                           max_fee=10000,
+                           distance_m=None):
+
+    if distance_m is None:
+        distance_m = haversine_meters(
+            store_lat,
+            store_lng,
+            cust_lat,
+            cust_lng
+        )
+
+    # Same logic as JS
+    if distance_m <= store_radius:
+        fee = inside_min_fee
+    else:
+        fee = max(distance_m * rate_per_meter, normal_min_fee)
+
+    return round(min(fee, max_fee), 2)
+
+
+# ----------------- Store grid index -----------------
+class StoreGrid:
+    """
+    Active stores bucketed into fixed lat/lng cells. A radius query only
+    visits the cells overlapping the search circle's bounding box, so its
+    cost depends on local density rather than on the total store count.
+    """
+
+    def __init__(self, cell_deg=0.05, ttl=600):
+        self.cell_deg = cell_deg
+        self.ttl = ttl
+        self._cells = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lng):
+        return math.floor(lat / self.cell_deg), math.floor(lng / self.cell_deg)
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def rebuild(self):
+        cells = defaultdict(list)
+        rows = (
+            db.session.query(Store.id, Store.latitude, Store.longitude)
+            .filter(
+                Store.is_active.is_(True),
+                Store.latitude.isnot(None),
+                Store.longitude.isnot(None),
+            )
+        )
+        for store_id, lat, lng in rows:
+            cells[self._cell(lat, lng)].append((store_id, lat, lng))
+        self._cells = dict(cells)
+        self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        ttl = current_app.config.get("STORE_GRID_TTL", self.ttl)
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > ttl:
+            with self._lock:
+                if self._loaded_at is None or time.monotonic() - self._loaded_at > ttl:
+                    self.rebuild()
+
+    def nearby(self, lat, lng, radius_m):
+        """Return [(store_id, distance_m, store_lat, store_lng)] within radius_m, nearest first."""
+        self._ensure_loaded()
+        cells = self._cells
+
+        dlat = radius_m / METERS_PER_DEGREE
+        dlng = radius_m / (METERS_PER_DEGREE * max(cos(radians(lat)), 0.01))
+        min_i, min_j = self._cell(lat - dlat, lng - dlng)
+        max_i, max_j = self._cell(lat + dlat, lng + dlng)
+
+        hits = []
+        for i in range(min_i, max_i + 1):
+            for j in range(min_j, max_j + 1):
+                for store_id, s_lat, s_lng in cells.get((i, j), ()):
+                    distance = haversine_meters(lat, lng, s_lat, s_lng)
+                    if distance <= radius_m:
+                        hits.append((store_id, distance, s_lat, s_lng))
+        hits.sort(key=lambda hit: hit[1])
+        return hits
+
+
+store_grid = StoreGrid()
+
+
+# Rebuilt on the next lookup after a store is added, moved or (de)activated
+watch("store_grid", {Store: ("latitude", "longitude", "is_active")}, on_commit=lambda keys: store_grid.invalidate())
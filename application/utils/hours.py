@@ -0,0 +1,73 @@
+import re
+from datetime import datetime
+from functools import lru_cache
+
+from sqlalchemy import and_, or_
+
+MINUTES_PER_DAY = 24 * 60
+
+_TIME_RE = re.compile(r'(\d{1,2}(?::\d{2})?\s*(?:am|pm)?)')
+_FORMATS = ("%H:%M", "%I%p", "%I:%M%p")
+
+
+@lru_cache(maxsize=1024)
+def parse_opening_hours(opening_hours):
+    """
+    Compile the free-text hours into (opens_at, closes_at) minutes of the day,
+    or (None, None) when they cannot be read (treated as closed).
+    Handles messy formats like:
+    - "Orders from 8am - 10pm"
+    - "8am - 10pm"
+    - "08:00 to 21:00"
+    - "24/7"
+    closes_at < opens_at means the store is open overnight.
+    """
+    if not opening_hours:
+        return None, None
+
+    opening_hours = opening_hours.lower()
+    if "24/7" in opening_hours:
+        return 0, MINUTES_PER_DAY
+
+    time_matches = _TIME_RE.findall(opening_hours)
+    if len(time_matches) != 2:
+        return None, None
+
+    open_str, close_str = (t.replace(" ", "") for t in time_matches)
+    for fmt in _FORMATS:
+        try:
+            open_time = datetime.strptime(open_str, fmt).time()
+            close_time = datetime.strptime(close_str, fmt).time()
+            break
+        except ValueError:
+            continue
+    else:
+        return None, None
+
+    return open_time.hour * 60 + open_time.minute, close_time.hour * 60 + close_time.minute
+
+
+def minute_of_day(now=None):
+    now = now or datetime.now()
+    return now.hour * 60 + now.minute
+
+
+def is_open_at(opens_at, closes_at, minute):
+    if opens_at is None or closes_at is None:
+        return False
+    if opens_at < closes_at:
+        return opens_at <= minute <= closes_at
+    return minute >= opens_at or minute <= closes_at
+
+
+def open_now_clause(model, now=None):
+    """SQL predicate equivalent to is_open_at() for model.opens_at / model.closes_at."""
+    minute = minute_of_day(now)
+    return and_(
+        model.opens_at.isnot(None),
+        model.closes_at.isnot(None),
+        or_(
+            and_(model.opens_at < model.closes_at, model.opens_at <= minute, model.closes_at >= minute),
+            and_(model.opens_at >= model.closes_at, or_(model.opens_at <= minute, model.closes_at >= minute)),
+        ),
+    )
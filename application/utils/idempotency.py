@@ -0,0 +1,117 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request, jsonify, flash, redirect, url_for, make_response, current_app
+from flask_login import current_user
+
+from .metrics import metrics
+
+IN_PROGRESS = "__in_progress__"
+
+
+class IdempotencyStore:
+    """
+    Stored responses keyed by (user id, key), each kept for
+    IDEMPOTENCY_TTL seconds. At most IDEMPOTENCY_CACHE_SIZE entries are
+    held; past that the least recently used ones are evicted, so a busy
+    day keeps deduplicating instead of refusing new users.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()  # (user_id, key) -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, user_id, key):
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is None:
+                return None
+            if time.monotonic() >= entry[0]:
+                del self._entries[(user_id, key)]
+                return None
+            self._entries.move_to_end((user_id, key))
+            return entry[1]
+
+    def set(self, user_id, key, value):
+        config = current_app.config
+        expires_at = time.monotonic() + config.get("IDEMPOTENCY_TTL", 3600)
+        with self._lock:
+            self._entries[(user_id, key)] = (expires_at, value)
+            self._entries.move_to_end((user_id, key))
+            while len(self._entries) > config.get("IDEMPOTENCY_CACHE_SIZE", 50000):
+                self._entries.popitem(last=False)
+                metrics.incr("idempotency.evicted")
+
+    def remove(self, user_id, key):
+        with self._lock:
+            self._entries.pop((user_id, key), None)
+
+
+idempotency_cache = IdempotencyStore()
+
+
+def get_idempotency_key():
+    """Client-supplied key from the Idempotency-Key header, form or JSON body."""
+    key = (
+        request.headers.get("Idempotency-Key")
+        or request.form.get("idempotency_key")
+        or (request.get_json(silent=True) or {}).get("idempotency_key")
+    )
+    if not key:
+        return None
+    return str(key).strip()[:128] or None
+
+
+def _replay(stored):
+    status, headers, body = stored
+    response = make_response(body, status)
+    for name, value in headers:
+        response.headers[name] = value
+    return response
+
+
+def idempotent(scope, pending_endpoint=None):
+    """
+    Run the view at most once per (user, scope, key) within the cache TTL.
+    Duplicates replay the stored response instead of redoing the work.
+    Requests without a key are handled normally.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = get_idempotency_key()
+            if not key or not current_user.is_authenticated:
+                return view(*args, **kwargs)
+
+            cache_key = f"{scope}:{key}"
+            stored = idempotency_cache.get(current_user.id, cache_key)
+            if stored is not None:
+                metrics.incr("idempotency.duplicates_avoided")
+                metrics.incr(f"idempotency.duplicates_avoided.{scope}")
+                if stored == IN_PROGRESS:
+                    if pending_endpoint and not request.is_json:
+                        flash("Your request is already being processed.", "info")
+                        return redirect(url_for(pending_endpoint))
+                    return jsonify(success=False, error="duplicate_in_progress"), 409
+                return _replay(stored)
+
+            idempotency_cache.set(current_user.id, cache_key, IN_PROGRESS)
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                idempotency_cache.remove(current_user.id, cache_key)
+                raise
+
+            if response.status_code >= 400 or response.is_streamed:
+                # Let the client fix the problem and retry with the same key.
+                idempotency_cache.remove(current_user.id, cache_key)
+            else:
+                headers = [(h, v) for h, v in response.headers.items() if h in ("Location", "Content-Type")]
+                idempotency_cache.set(
+                    current_user.id, cache_key, (response.status_code, headers, response.get_data())
+                )
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app, session
+
+from ..models import db, Store, Staff, User, DeliveryGuy, Administrater, Ambassador
+from .changes import watch
+
+# session["user_type"] -> models the id may belong to, tried in order.
+USER_MODELS = {
+    "store": (Store, Staff),
+    "customer": (User,),
+    "delivery_guy": (DeliveryGuy,),
+    "administrator": (Administrater,),
+    "ambassador": (Ambassador,),
+}
+MODEL_TYPES = {model: user_type for user_type, models in USER_MODELS.items() for model in models}
+
+# Columns copied into the cached principal; anything else (password,
+# balances such as loyalty_points, relationships, ...) is read from the
+# database row on first access. Keep mutable balances out of this list.
+PRINCIPAL_FIELDS = (
+    "id", "email", "name", "names", "username", "lastname", "is_active", "confirmed",
+    "store_id", "role", "district", "town", "image_file", "referral_code",
+    "registered_on",
+)
+
+_cache = OrderedDict()  # (user_type, id) -> (loaded_at, model, fields)
+_lock = threading.Lock()
+
+
+class Principal:
+    """
+    Request-scoped stand-in for the logged-in row. Cached fields are served
+    from memory; other attributes, and every assignment, go to the real row,
+    which is loaded into the current db session on demand.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, user_type, model, fields):
+        object.__setattr__(self, "user_type", user_type)
+        object.__setattr__(self, "model", model)
+        object.__setattr__(self, "_fields", dict(fields))
+        object.__setattr__(self, "_record", None)
+
+    @property
+    def is_active(self):
+        return self._fields.get("is_active", True) is not False
+
+    def get_id(self):
+        return str(self._fields["id"])
+
+    @property
+    def record(self):
+        if self._record is None:
+            object.__setattr__(self, "_record", db.session.get(self.model, self._fields["id"]))
+        return self._record
+
+    def __getattr__(self, name):
+        fields = self.__dict__["_fields"]
+        if name in fields:
+            return fields[name]
+        return getattr(self.record, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.record, name, value)
+        if name in self._fields:
+            self._fields[name] = value
+
+    def __eq__(self, other):
+        if isinstance(other, Principal):
+            return (self.model, self.id) == (other.model, other.id)
+        return isinstance(other, self.model) and other.id == self.id
+
+    def __hash__(self):
+        return hash((self.model, self.id))
+
+    def __repr__(self):
+        return f"<Principal {self.model.__name__} {self.id}>"
+
+
+def _snapshot(row):
+    return {f: getattr(row, f) for f in PRINCIPAL_FIELDS if hasattr(type(row), f)}
+
+
+def _load(user_type, user_id):
+    for model in USER_MODELS.get(user_type, ()):
+        row = db.session.get(model, user_id)
+        if row is not None:
+            return model, _snapshot(row)
+    return None
+
+
+def load_user(user_id):
+    """Flask-Login user_loader backed by the identity cache."""
+    user_type = session.get("user_type")
+    if user_type not in USER_MODELS:
+        return None
+    try:
+        key = (user_type, int(user_id))
+    except (TypeError, ValueError):
+        return None
+
+    ttl = current_app.config.get("IDENTITY_CACHE_TTL", 30)
+    with _lock:
+        cached = _cache.get(key)
+    if cached is None or time.monotonic() - cached[0] > ttl:
+        loaded = _load(*key)
+        if loaded is None:
+            invalidate(*key)
+            return None
+        cached = (time.monotonic(),) + loaded
+        with _lock:
+            _cache[key] = cached
+            _cache.move_to_end(key)
+            while len(_cache) > current_app.config.get("IDENTITY_CACHE_SIZE", 10000):
+                _cache.popitem(last=False)
+    return Principal(user_type, cached[1], cached[2])
+
+
+def invalidate(user_type, user_id):
+    with _lock:
+        _cache.pop((user_type, user_id), None)
+
+
+# ----------------- Invalidation -----------------
+def _invalidate_identities(keys):
+    for model, user_id in keys:
+        invalidate(MODEL_TYPES[model], user_id)
+
+
+watch("identity", dict.fromkeys(MODEL_TYPES), on_commit=_invalidate_identities)
@@ -0,0 +1,164 @@
+import smtplib
+import threading
+import time
+from collections import deque
+
+from flask import current_app
+
+from .metrics import metrics
+from .workers import WorkerPool
+
+
+class MailError(Exception):
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+# ----------------- Provider backends -----------------
+class SendGridBackend:
+    """
+    One SendGridAPIClient for the process. Messages that share sender,
+    subject and body go out in a single API call, one personalization per
+    recipient, so a broadcast is one request instead of one per address.
+    """
+
+    max_batch = 1000  # SendGrid's personalization limit per request
+
+    def __init__(self, api_key):
+        from sendgrid import SendGridAPIClient
+
+        self.client = SendGridAPIClient(api_key)
+
+    def send(self, messages):
+        from sendgrid.helpers.mail import Mail
+
+        first = messages[0]
+        mail = Mail(
+            from_email=first["sender"],
+            to_emails=[m["to"] for m in messages],
+            subject=first["subject"],
+            html_content=first["html"],
+            plain_text_content=first["text"],
+            is_multiple=True,
+        )
+        try:
+            response = self.client.send(mail)
+        except Exception as e:
+            status = getattr(e, "status_code", None)
+            raise MailError(f"SendGrid error {status}: {e}", retryable=status is None or status == 429 or status >= 500)
+        current_app.logger.info(f"SendGrid accepted {len(messages)} email(s) | Status: {response.status_code}")
+
+
+class SmtpBackend:
+    """Flask-Mail over SMTP; a batch shares one connection."""
+
+    max_batch = 100
+
+    def send(self, messages):
+        from flask_mail import Message
+        from application import mail
+
+        try:
+            with mail.connect() as conn:
+                for m in messages:
+                    msg = Message(m["subject"], sender=m["sender"], recipients=[m["to"]])
+                    msg.body = m["text"]
+                    msg.html = m["html"]
+                    conn.send(msg)
+        except smtplib.SMTPRecipientsRefused as e:
+            raise MailError(f"SMTP refused recipients: {e}", retryable=False)
+        except (smtplib.SMTPException, OSError) as e:
+            raise MailError(f"SMTP error: {e}")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def mail_backend():
+    """Process-wide backend, built from EMAIL_BACKEND on first use."""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = current_app.config.get("EMAIL_BACKEND", "sendgrid")
+                if name == "fake":
+                    from .fake_mail import FakeMailBackend
+                    _backend = FakeMailBackend()
+                elif name == "smtp":
+                    _backend = SmtpBackend()
+                else:
+                    _backend = SendGridBackend(current_app.config.get("SENDGRID_API_KEY"))
+    return _backend
+
+
+# ----------------- Delivery -----------------
+def _deliver(backend, group):
+    """Send one group, retrying transient failures with exponential backoff."""
+    max_attempts = current_app.config.get("EMAIL_MAX_ATTEMPTS", 4)
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            with metrics.timer("email.send"):
+                backend.send(group)
+        except MailError as e:
+            if not e.retryable or attempt >= max_attempts:
+                metrics.incr("email.failed", len(group))
+                current_app.logger.error(f"Email to {len(group)} recipient(s) failed after {attempt} attempts: {e}")
+                return
+            metrics.incr("email.retried")
+            time.sleep(2 ** attempt)
+            continue
+        metrics.incr("email.sent", len(group))
+        return
+
+
+def deliver_batch(messages):
+    """Group messages with identical content and send each group as one provider call."""
+    backend = mail_backend()
+    groups = {}
+    for m in messages:
+        groups.setdefault((m["sender"], m["subject"], m["html"], m["text"]), []).append(m)
+    for group in groups.values():
+        for i in range(0, len(group), backend.max_batch):
+            _deliver(backend, group[i:i + backend.max_batch])
+
+
+# ----------------- Queue -----------------
+# Messages wait in _pending; every send_mail also queues a _send_pending job
+# on the pool, and each job takes whatever has piled up (up to
+# EMAIL_BATCH_SIZE), so busy periods go out in batches.
+mail_pool = WorkerPool("email", workers=2, maxsize=1000)
+_pending = deque()
+_pending_lock = threading.Lock()
+
+
+def _send_pending():
+    batch_size = current_app.config.get("EMAIL_BATCH_SIZE", 50)
+    with _pending_lock:
+        batch = [_pending.popleft() for _ in range(min(batch_size, len(_pending)))]
+    if batch:
+        deliver_batch(batch)
+
+
+def send_mail(to, subject, html=None, text=None, sender=None):
+    """Queue an email for background delivery. Returns False if it was dropped."""
+    config = current_app.config
+    message = {
+        "to": to,
+        "subject": subject,
+        "html": html,
+        "text": text,
+        "sender": sender or config.get("SENDGRID_FROM_EMAIL") or config.get("MAIL_DEFAULT_SENDER"),
+    }
+    with _pending_lock:
+        if len(_pending) >= config.get("EMAIL_QUEUE_SIZE", 1000):
+            metrics.incr("email.dropped")
+            current_app.logger.warning(f"Email queue full, dropping mail to {to}.")
+            return False
+        _pending.append(message)
+    # A full pool queue already holds jobs that will pick this message up
+    mail_pool.submit(_send_pending)
+    return True
@@ -0,0 +1,45 @@
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class Metrics:
+    """In-process counters and timers, exposed as JSON on /metrics."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = defaultdict(int)
+        self.timers = defaultdict(lambda: {"count": 0, "total": 0.0, "max": 0.0})
+
+    def incr(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def observe(self, name, seconds):
+        with self._lock:
+            timer = self.timers[name]
+            timer["count"] += 1
+            timer["total"] += seconds
+            timer["max"] = max(timer["max"], seconds)
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "timers": {
+                    name: dict(t, avg=(t["total"] / t["count"]) if t["count"] else 0.0)
+                    for name, t in self.timers.items()
+                },
+            }
+
+
+metrics = Metrics()
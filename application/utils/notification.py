@@ -1,6 +1,7 @@
 # utils/notifications.py
 from ..models import Notification, db
 from datetime import datetime
+from sqlalchemy import insert
 
 def create_notification(user_type, user_id, message):
     notification = Notification(
@@ -12,3 +13,19 @@ def create_notification(user_type, user_id, message):
     )
     db.session.add(notification)
     db.session.commit()
+
+def create_notifications_bulk(user_type, user_ids, message):
+    """Write one notification per recipient with a single multi-row INSERT and one commit."""
+    timestamp = datetime.utcnow()
+    rows = [
+        {"user_type": user_type, "user_id": user_id, "message": message, "timestamp": timestamp, "is_read": False}
+        for user_id in dict.fromkeys(user_ids)
+    ]
+    if rows:
+        db.session.execute(insert(Notification), rows)
+        db.session.commit()
+    return len(rows)
+
+def store_drivers_room(store_id):
+    """Socket room every delivery guy of a store joins on connect."""
+    return f"store_{store_id}_drivers"
@@ -0,0 +1,266 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import delete, event, select
+from sqlalchemy.orm import Session
+
+from .. import socketio
+from ..models import db, OutboxEvent, Order, User
+from .workers import WorkerPool
+
+OUTBOX_PENDING = "pending"
+OUTBOX_RUNNING = "running"
+OUTBOX_DONE = "done"
+OUTBOX_FAILED = "failed"
+
+HANDLERS = {}
+GIVE_UP_HANDLERS = {}
+
+outbox_pool = WorkerPool("outbox", workers=4, maxsize=1000)
+
+_wake = threading.Event()
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+_inline = threading.local()
+
+
+def outbox_handler(kind, on_give_up=None):
+    """
+    Register func(**payload) as the handler for kind. on_give_up(**payload),
+    if given, runs in the same transaction that marks the event failed.
+    """
+    def decorator(func):
+        HANDLERS[kind] = func
+        if on_give_up is not None:
+            GIVE_UP_HANDLERS[kind] = on_give_up
+        return func
+    return decorator
+
+
+# ----------------- Writing events -----------------
+def enqueue(kind, **payload):
+    """
+    Record a side effect on the current session. Nothing is sent until the
+    caller commits; a rollback discards the event along with the change.
+    """
+    outbox_event = OutboxEvent(kind=kind, payload=payload, status=OUTBOX_PENDING)
+    db.session.add(outbox_event)
+    db.session.info["outbox_pending"] = True
+    start_dispatcher(current_app._get_current_object())  # in case the server did not
+    return outbox_event
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if not session.info.pop("outbox_pending", None):
+        return
+    app = current_app._get_current_object()
+    if app.config.get("WORKERS_INLINE"):
+        _drain_inline(app)
+    else:
+        _wake.set()
+
+
+def _drain_inline(app):
+    """Deliver right after the commit, as the dispatcher would, on a session of its own."""
+    if getattr(_inline, "draining", False):
+        return  # the running drain() picks up events enqueued by handlers
+    _inline.draining = True
+    try:
+        with app.app_context():
+            drain()
+    except Exception:
+        app.logger.exception("Inline outbox drain failed.")
+    finally:
+        _inline.draining = False
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop("outbox_pending", None)
+
+
+# ----------------- Dispatching -----------------
+def claim_batch(limit=None):
+    """
+    Lease due events to this process and return their ids. A lease that is
+    never completed (worker died mid-job) expires and the event is picked up
+    again.
+    """
+    limit = limit or current_app.config.get("OUTBOX_BATCH_SIZE", 100)
+    lease = timedelta(seconds=current_app.config.get("OUTBOX_LEASE_SECONDS", 60))
+    now = datetime.utcnow()
+
+    events = (
+        OutboxEvent.query
+        .filter(
+            OutboxEvent.status.in_([OUTBOX_PENDING, OUTBOX_RUNNING]),
+            OutboxEvent.available_at <= now,
+        )
+        .order_by(OutboxEvent.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    for outbox_event in events:
+        outbox_event.status = OUTBOX_RUNNING
+        outbox_event.available_at = now + lease
+    ids = [outbox_event.id for outbox_event in events]
+    db.session.commit()
+    return ids
+
+
+def run_event(event_id):
+    """Run one event's handler; on failure schedule a retry with exponential backoff."""
+    outbox_event = db.session.get(OutboxEvent, event_id)
+    if outbox_event is None or outbox_event.status in (OUTBOX_DONE, OUTBOX_FAILED):
+        return
+
+    kind, payload = outbox_event.kind, dict(outbox_event.payload or {})
+    try:
+        handler = HANDLERS.get(kind)
+        if handler is None:
+            raise LookupError(f"No outbox handler for {kind!r}")
+        handler(**payload)
+    except Exception as e:
+        db.session.rollback()
+        outbox_event = db.session.get(OutboxEvent, event_id)
+        outbox_event.attempts = (outbox_event.attempts or 0) + 1
+        outbox_event.last_error = str(e)[:500]
+        if outbox_event.attempts >= current_app.config.get("OUTBOX_MAX_ATTEMPTS", 6):
+            outbox_event.status = OUTBOX_FAILED
+            current_app.logger.error(f"Outbox event {event_id} ({kind}) gave up: {e}")
+            if kind in GIVE_UP_HANDLERS:
+                GIVE_UP_HANDLERS[kind](**payload)
+        else:
+            outbox_event.status = OUTBOX_PENDING
+            outbox_event.available_at = datetime.utcnow() + timedelta(seconds=2 ** outbox_event.attempts)
+            current_app.logger.warning(f"Outbox event {event_id} ({kind}) failed, retrying: {e}")
+    else:
+        outbox_event.status = OUTBOX_DONE
+        outbox_event.last_error = None
+    db.session.commit()
+
+
+def drain():
+    """Run every due event synchronously. Used by tests and WORKERS_INLINE setups."""
+    processed = 0
+    while True:
+        ids = claim_batch()
+        if not ids:
+            return processed
+        for event_id in ids:
+            run_event(event_id)
+        processed += len(ids)
+
+
+def purge_done(batch_size=1000):
+    """Delete done events older than OUTBOX_RETENTION_HOURS, in batches. Returns the number deleted."""
+    cutoff = datetime.utcnow() - timedelta(hours=current_app.config.get("OUTBOX_RETENTION_HOURS", 24))
+    purged = 0
+    while True:
+        batch = (
+            select(OutboxEvent.id)
+            .where(OutboxEvent.status == OUTBOX_DONE, OutboxEvent.created_at < cutoff)
+            .limit(batch_size)
+        )
+        deleted = db.session.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(batch))).rowcount
+        db.session.commit()
+        purged += deleted
+        if deleted < batch_size:
+            return purged
+
+
+def _dispatch_loop(app):
+    from .sms import requeue_stale_sms
+
+    interval = app.config.get("OUTBOX_POLL_INTERVAL", 2.0)
+    purge_interval = app.config.get("OUTBOX_PURGE_INTERVAL", 3600)
+    last_purge = 0.0
+    while True:
+        _wake.wait(interval)
+        _wake.clear()
+        try:
+            with app.app_context():
+                for event_id in claim_batch():
+                    outbox_pool.submit(run_event, event_id)
+                if time.monotonic() - last_purge >= purge_interval:
+                    last_purge = time.monotonic()
+                    purged = purge_done()
+                    if purged:
+                        app.logger.info(f"Purged {purged} delivered outbox events.")
+                    requeued = requeue_stale_sms()
+                    if requeued:
+                        app.logger.info(f"Requeued {requeued} stale SMS messages.")
+        except Exception:
+            app.logger.exception("Outbox dispatcher failed to claim events.")
+
+
+def start_dispatcher(app):
+    """
+    Start the background dispatcher. Called at server startup so events left
+    over from a previous process are delivered without waiting for a new one.
+    """
+    global _dispatcher
+    if _dispatcher is not None or app.config.get("WORKERS_INLINE"):
+        return
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = threading.Thread(
+                target=_dispatch_loop, args=(app,), name="outbox-dispatcher", daemon=True
+            )
+            _dispatcher.start()
+
+
+# ----------------- Handlers -----------------
+@outbox_handler("emit")
+def _emit(event, data, room):
+    socketio.emit(event, data, room=room)
+
+
+@outbox_handler("notification")
+def _notification(user_type, user_id, message):
+    from .notification import create_notification
+    create_notification(user_type=user_type, user_id=user_id, message=message)
+
+
+@outbox_handler("notification_bulk")
+def _notification_bulk(user_type, user_ids, message):
+    from .notification import create_notifications_bulk
+    create_notifications_bulk(user_type, user_ids, message)
+
+
+@outbox_handler("sms")
+def _sms(message_id):
+    from .sms import submit_sms
+    submit_sms(message_id)
+
+
+def _payment_proof_failed(order_id, spool_path):
+    from .uploads import fail_payment_proof
+    fail_payment_proof(order_id, spool_path)
+
+
+@outbox_handler("payment_proof", on_give_up=_payment_proof_failed)
+def _payment_proof(order_id, spool_path):
+    from .uploads import process_payment_proof
+    process_payment_proof(order_id, spool_path)
+
+
+@outbox_handler("loyalty")
+def _loyalty(order_id):
+    from application.main.views import award_loyalty_points
+
+    order = db.session.get(Order, order_id)
+    user = db.session.get(User, order.user_id) if order else None
+    if not user:
+        return
+    total_spent = sum(
+        item.product_price * item.quantity
+        for item in order.order_items
+    ) + (order.deliveryfee or 0)
+    total_spent -= (order.coupon_discount or 0) + (order.points_discount or 0)
+    if total_spent > 0:
+        award_loyalty_points(user, order, total_spent)
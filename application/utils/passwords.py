@@ -0,0 +1,69 @@
+import threading
+
+import bcrypt
+from flask import current_app
+
+from .metrics import metrics
+
+try:
+    from eventlet import patcher, tpool
+except ImportError:  # eventlet is only needed for the socket server
+    patcher = tpool = None
+
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def _semaphore():
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(current_app.config.get("PASSWORD_HASH_CONCURRENCY", 4))
+    return _slots
+
+
+def _offload(name, func, *args):
+    """
+    Run a bcrypt call without stalling the eventlet hub: under monkey patching
+    it goes to eventlet's native thread pool (tpool), capped by
+    PASSWORD_HASH_CONCURRENCY so a login storm queues instead of starving it.
+    Timing stays on the calling green thread: {name}.wait is the time spent
+    waiting for a slot, {name} the hash itself (plus the tpool hand-off).
+    """
+    with metrics.timer(f"{name}.wait"):
+        slots = _semaphore()
+        slots.acquire()
+    try:
+        with metrics.timer(name):
+            if tpool is not None and patcher.is_monkey_patched("thread"):
+                return tpool.execute(func, *args)
+            return func(*args)
+    finally:
+        slots.release()
+
+
+def _rounds():
+    return current_app.config.get("BCRYPT_LOG_ROUNDS", 12)
+
+
+def hash_password(password):
+    salt = bcrypt.gensalt(rounds=_rounds())
+    return _offload("password.hash", bcrypt.hashpw, password.encode("utf-8"), salt).decode("utf-8")
+
+
+def check_password(pw_hash, password):
+    if not pw_hash:
+        return False
+    try:
+        return _offload("password.check", bcrypt.checkpw, password.encode("utf-8"), pw_hash.encode("utf-8"))
+    except ValueError:  # not a bcrypt hash
+        return False
+
+
+def needs_rehash(pw_hash):
+    """True when pw_hash was made with a cost other than BCRYPT_LOG_ROUNDS ("$2b$12$...")."""
+    try:
+        return int(pw_hash.split("$")[2]) != _rounds()
+    except (AttributeError, IndexError, ValueError):
+        return False
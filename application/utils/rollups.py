@@ -0,0 +1,219 @@
+from collections import defaultdict
+
+from sqlalchemy import delete, event, inspect, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..models import db, Order, Sales, SalesRollupDaily, SalesRollupProduct, SalesRollupHourly
+
+BUCKET_SETTLED = "settled"
+BUCKET_OPEN = "open"
+BUCKET_CANCELLED = "cancelled"
+
+SETTLED_STATUSES = ("Completed", "Delivered", "Out for Delivery", "Collected")
+
+ROLLUPS = (SalesRollupDaily, SalesRollupProduct, SalesRollupHourly)
+
+# Unique key of each rollup table (primary key or unique constraint)
+ROLLUP_KEYS = {
+    SalesRollupDaily: ("store_id", "day", "bucket"),
+    SalesRollupProduct: ("store_id", "day", "product_id", "bucket"),
+    SalesRollupHourly: ("store_id", "day", "hour", "bucket"),
+}
+_UNCHANGED = object()
+
+# INSERT ... ON CONFLICT DO UPDATE for the databases we deploy on
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def status_bucket(status):
+    if status == "Cancelled":
+        return BUCKET_CANCELLED
+    if status in SETTLED_STATUSES:
+        return BUCKET_SETTLED
+    return BUCKET_OPEN
+
+
+def _totals():
+    return defaultdict(lambda: [0.0, 0, 0, None])  # revenue, quantity, orders, product_name
+
+
+def _contributions(rows, bucket, out=None, sign=1):
+    """Add sign * (revenue, quantity, orders) of one order's sales rows to out[(model, key)]."""
+    out = _totals() if out is None else out
+    seen = set()
+    for row in rows:
+        when = row["date_"]
+        if when is None:
+            continue
+        base = (("store_id", row["store_id"]), ("day", when.date()), ("bucket", bucket))
+        for model, key in (
+            (SalesRollupDaily, base),
+            (SalesRollupProduct, base + (("product_id", row["product_id"]),)),
+            (SalesRollupHourly, base + (("hour", when.hour),)),
+        ):
+            totals = out[(model, key)]
+            totals[0] += sign * row["price"] * row["quantity"]
+            totals[1] += sign * row["quantity"]
+            if (model, key) not in seen:
+                seen.add((model, key))
+                totals[2] += sign
+            if model is SalesRollupProduct:
+                totals[3] = row["product_name"]
+    return out
+
+
+def _apply(conn, deltas):
+    """
+    Add deltas to the rollup rows in one upsert per table, so concurrent
+    checkouts touching the same key add up instead of racing to insert it.
+    """
+    upsert = _UPSERT_INSERTS[conn.dialect.name]
+    rows = defaultdict(list)
+    for (model, key), (revenue, quantity, orders, product_name) in deltas.items():
+        if not (abs(revenue) > 1e-9 or quantity or orders):
+            continue
+        values = dict(key, revenue=revenue, quantity=quantity, orders=orders)
+        if model is SalesRollupProduct:
+            values["product_name"] = product_name
+        rows[model].append(values)
+
+    for model, values in rows.items():
+        table = model.__table__
+        stmt = upsert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(ROLLUP_KEYS[model]),
+            set_={
+                "revenue": table.c.revenue + stmt.excluded.revenue,
+                "quantity": table.c.quantity + stmt.excluded.quantity,
+                "orders": table.c.orders + stmt.excluded.orders,
+            },
+        )
+        conn.execute(stmt, values)
+
+
+def _sales_rows(conn, order_ids):
+    sales = Sales.__table__
+    rows = defaultdict(list)
+    result = conn.execute(
+        select(sales.c.id, sales.c.order_id, sales.c.store_id, sales.c.product_id,
+               sales.c.product_name, sales.c.price, sales.c.quantity, sales.c.date_)
+        .where(sales.c.order_id.in_(order_ids))
+    )
+    for row in result.mappings():
+        rows[row["order_id"]].append(row)
+    return rows
+
+
+def _row(sale):
+    return {
+        "id": sale.id, "store_id": sale.store_id, "product_id": sale.product_id,
+        "product_name": sale.product_name, "price": sale.price,
+        "quantity": sale.quantity, "date_": sale.date_,
+    }
+
+
+# ----------------- Incremental maintenance -----------------
+def _state(tracked, order_id):
+    return tracked.setdefault(order_id, {
+        "is_new": False, "deleted_order": False, "old_status": _UNCHANGED,
+        "new_sales": set(), "deleted_sales": [],
+    })
+
+
+@event.listens_for(Order.status, "set", active_history=True)
+def _load_old_status(target, value, oldvalue, initiator):
+    """No-op; registering it loads an expired order's old status so the flush history has it."""
+
+
+@event.listens_for(Session, "after_flush")
+def _track_order_changes(session, flush_context):
+    tracked = session.info.get("rollup_orders", {})
+    for obj in session.new:
+        if type(obj) is Order:
+            _state(tracked, obj.id)["is_new"] = True
+        elif type(obj) is Sales:
+            _state(tracked, obj.order_id)["new_sales"].add(obj.id)
+    for obj in session.deleted:
+        if type(obj) is Order:
+            _state(tracked, obj.id)["deleted_order"] = True
+        elif type(obj) is Sales:
+            _state(tracked, obj.order_id)["deleted_sales"].append(_row(obj))
+    for obj in session.dirty:
+        if type(obj) is Order:
+            history = inspect(obj).attrs.status.history
+            if history.has_changes():
+                state = _state(tracked, obj.id)
+                if state["old_status"] is _UNCHANGED and history.deleted:
+                    state["old_status"] = history.deleted[0]
+    if tracked:
+        session.info["rollup_orders"] = tracked
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_rollups(session):
+    """Move each touched order's sales between buckets in the committing transaction."""
+    session.flush()  # before_commit runs ahead of the commit's own flush
+    tracked = session.info.pop("rollup_orders", None)
+    if not tracked:
+        return
+
+    conn = session.connection()
+    order = Order.__table__
+    statuses = dict(conn.execute(select(order.c.id, order.c.status).where(order.c.id.in_(list(tracked)))).all())
+    rows_by_order = _sales_rows(conn, list(tracked))
+
+    deltas = _totals()
+    for order_id, state in tracked.items():
+        current = rows_by_order.get(order_id, [])
+        exists = order_id in statuses and not state["deleted_order"]
+        status = statuses.get(order_id)
+        if exists:
+            _contributions(current, status_bucket(status), deltas)
+        if not state["is_new"]:
+            old_rows = [r for r in current if r["id"] not in state["new_sales"]] + state["deleted_sales"]
+            old_status = status if state["old_status"] is _UNCHANGED else state["old_status"]
+            _contributions(old_rows, status_bucket(old_status), deltas, sign=-1)
+    _apply(conn, deltas)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_order_changes(session):
+    session.info.pop("rollup_orders", None)
+
+
+# ----------------- Backfill -----------------
+def rebuild_sales_rollups(batch_size=5000):
+    """Recompute every rollup row from Sales joined to Order."""
+    sales, order = Sales.__table__, Order.__table__
+    for model in ROLLUPS:
+        db.session.execute(delete(model))
+
+    totals = _totals()
+    current_id, current_status, current_rows = None, None, []
+    result = db.session.execute(
+        select(sales.c.order_id, order.c.status, sales.c.store_id, sales.c.product_id,
+               sales.c.product_name, sales.c.price, sales.c.quantity, sales.c.date_)
+        .join(order, order.c.id == sales.c.order_id)
+        .order_by(sales.c.order_id)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in result.mappings():
+        if row["order_id"] != current_id:
+            _contributions(current_rows, status_bucket(current_status), totals)
+            current_id, current_status, current_rows = row["order_id"], row["status"], []
+        current_rows.append(row)
+    _contributions(current_rows, status_bucket(current_status), totals)
+
+    for model in ROLLUPS:
+        rows = []
+        for (m, key), (revenue, quantity, orders, product_name) in totals.items():
+            if m is model:
+                values = dict(key, revenue=revenue, quantity=quantity, orders=orders)
+                if model is SalesRollupProduct:
+                    values["product_name"] = product_name
+                rows.append(values)
+        for i in range(0, len(rows), batch_size):
+            db.session.execute(insert(model.__table__), rows[i:i + batch_size])
+    db.session.commit()
+    return len(totals)
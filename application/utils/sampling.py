@@ -0,0 +1,103 @@
+import random
+import threading
+import time
+
+from flask import current_app
+
+from ..models import db, Product, Store
+from .changes import watch
+
+
+class SamplePool:
+    """
+    Precomputed pool of lightweight candidate rows. Each request draws a
+    fresh random subset with random.sample (O(k)); the pool itself is
+    reloaded after `ttl` seconds or when the catalog changes.
+    """
+
+    def __init__(self, name, loader, size=200, ttl=300):
+        self.name = name
+        self.loader = loader
+        self.size = size
+        self.ttl = ttl
+        self._pool = []
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        self._loaded_at = None
+
+    def _refresh(self):
+        size = current_app.config.get(f"{self.name.upper()}_POOL_SIZE", self.size)
+        pool = self.loader(size)
+        self._pool = pool
+        self._loaded_at = time.monotonic()
+
+    def sample(self, k):
+        ttl = current_app.config.get("SAMPLE_POOL_TTL", self.ttl)
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > ttl:
+            # One request reloads; concurrent ones keep serving the old pool.
+            if self._lock.acquire(blocking=not self._pool):
+                try:
+                    self._refresh()
+                finally:
+                    self._lock.release()
+        pool = self._pool
+        return random.sample(pool, min(k, len(pool)))
+
+
+def _sample_ids(query, size):
+    ids = [row[0] for row in query]
+    return ids if len(ids) <= size else random.sample(ids, size)
+
+
+def _load_meals(size):
+    ids = _sample_ids(
+        db.session.query(Product.id)
+        .join(Store, Product.store_id == Store.id)
+        .filter(Product.is_active.is_(True), Store.is_active.is_(True)),
+        size,
+    )
+    if not ids:
+        return []
+    rows = (
+        db.session.query(Product.id, Product.productname, Product.pictures, Product.price, Store.name)
+        .join(Store, Product.store_id == Store.id)
+        .filter(Product.id.in_(ids))
+        .all()
+    )
+    return [
+        {"id": id, "productname": name, "pictures": pictures, "price": price, "store": {"name": store_name}}
+        for id, name, pictures, price, store_name in rows
+    ]
+
+
+def _load_restaurants(size):
+    ids = _sample_ids(db.session.query(Store.id).filter(Store.is_active.is_(True)), size)
+    if not ids:
+        return []
+    rows = (
+        db.session.query(Store.id, Store.name, Store.district, Store.town)
+        .filter(Store.id.in_(ids))
+        .all()
+    )
+    return [
+        {"id": id, "name": name, "district": district, "town": town}
+        for id, name, district, town in rows
+    ]
+
+
+landing_meals = SamplePool("landing_meals", _load_meals, size=200)
+landing_restaurants = SamplePool("landing_restaurants", _load_restaurants, size=100)
+
+
+# ----------------- Invalidation -----------------
+def _invalidate_pools(keys):
+    landing_meals.invalidate()
+    landing_restaurants.invalidate()
+
+
+watch("landing", {
+    Product: ("productname", "price", "pictures", "is_active", "store_id"),
+    Store: ("name", "district", "town", "is_active"),
+}, on_commit=_invalidate_pools)
@@ -0,0 +1,152 @@
+import re
+
+from flask import current_app
+from sqlalchemy import Float, Integer, func, inspect, literal_column, or_, text
+
+from ..models import db, Product, Store
+
+# ----------------- Index schema -----------------
+# SQLite: external-content FTS5 tables kept in sync by triggers.
+# Postgres: stored generated tsvector columns with GIN indexes.
+# Both are maintained by the database on every product/store write, so
+# there is no application-side reindexing.
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        productname, description,
+        content='product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, productname, description)
+        VALUES (new.id, new.productname, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, productname, description)
+        VALUES ('delete', old.id, old.productname, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF productname, description ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, productname, description)
+        VALUES ('delete', old.id, old.productname, old.description);
+        INSERT INTO product_fts(rowid, productname, description)
+        VALUES (new.id, new.productname, new.description);
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS store_fts USING fts5(
+        name, district, town,
+        content='store', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS store_fts_ai AFTER INSERT ON store BEGIN
+        INSERT INTO store_fts(rowid, name, district, town)
+        VALUES (new.id, new.name, new.district, new.town);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_fts_ad AFTER DELETE ON store BEGIN
+        INSERT INTO store_fts(store_fts, rowid, name, district, town)
+        VALUES ('delete', old.id, old.name, old.district, old.town);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_fts_au AFTER UPDATE OF name, district, town ON store BEGIN
+        INSERT INTO store_fts(store_fts, rowid, name, district, town)
+        VALUES ('delete', old.id, old.name, old.district, old.town);
+        INSERT INTO store_fts(rowid, name, district, town)
+        VALUES (new.id, new.name, new.district, new.town);
+    END""",
+]
+
+SQLITE_REBUILD = [
+    "INSERT INTO product_fts(product_fts) VALUES ('rebuild')",
+    "INSERT INTO store_fts(store_fts) VALUES ('rebuild')",
+]
+
+POSTGRES_DDL = [
+    """ALTER TABLE product ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(productname, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_product_search_vector ON product USING gin (search_vector)",
+    """ALTER TABLE store ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(district, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(town, '')), 'B')
+        ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_store_search_vector ON store USING gin (search_vector)",
+]
+
+_backend_by_engine = {}
+
+
+def install_search_index():
+    """
+    Create the index if it is missing and re-read every row into it. Used by
+    `flask search-index` and create_all setups; migrations create it otherwise.
+    """
+    dialect = db.engine.dialect.name
+    statements = {"sqlite": SQLITE_DDL + SQLITE_REBUILD, "postgresql": POSTGRES_DDL}.get(dialect, [])
+    with db.engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+    _backend_by_engine.pop(db.engine, None)
+
+
+def _backend():
+    engine = db.engine
+    if engine not in _backend_by_engine:
+        dialect = engine.dialect.name
+        inspector = inspect(engine)
+        if dialect == "sqlite" and inspector.has_table("product_fts"):
+            backend = "fts5"
+        elif dialect == "postgresql" and any(
+            c["name"] == "search_vector" for c in inspector.get_columns("product")
+        ):
+            backend = "tsvector"
+        else:
+            backend = "like"
+            current_app.logger.warning("Full-text index missing, search falls back to ILIKE.")
+        _backend_by_engine[engine] = backend
+    return _backend_by_engine[engine]
+
+
+def _terms(q):
+    return re.findall(r"\w+", q.lower())[:8]
+
+
+# ----------------- Queries -----------------
+def _fts5_ranked(table, weights, terms):
+    match = " ".join(f'"{t}"*' for t in terms)
+    return (
+        text(f"SELECT rowid, bm25({table}, {weights}) AS rank FROM {table} WHERE {table} MATCH :match")
+        .bindparams(match=match)
+        .columns(rowid=Integer, rank=Float)
+        .subquery()
+    )
+
+
+def _ranked(query, model, table, weights, columns, q):
+    terms = _terms(q)
+    if not terms:
+        return query.filter(db.false())
+
+    backend = _backend()
+    if backend == "fts5":
+        hits = _fts5_ranked(table, weights, terms)
+        return query.join(hits, hits.c.rowid == model.id).order_by(hits.c.rank, model.id)
+
+    if backend == "tsvector":
+        tsquery = func.to_tsquery("simple", " & ".join(f"{t}:*" for t in terms))
+        vector = literal_column(f"{model.__table__.name}.search_vector")
+        return query.filter(vector.op("@@")(tsquery)).order_by(func.ts_rank(vector, tsquery).desc(), model.id)
+
+    return query.filter(*[
+        or_(*[column.ilike(f"%{t}%") for column in columns]) for t in terms
+    ]).order_by(model.id)
+
+
+def search_products(query, q):
+    """Filter a Product query to matches for q, best match first (prefix matching per word)."""
+    return _ranked(query, Product, "product_fts", "10.0, 1.0",
+                   [Product.productname, Product.description], q)
+
+
+def search_stores(query, q):
+    """Filter a Store query to matches for q, best match first (prefix matching per word)."""
+    return _ranked(query, Store, "store_fts", "10.0, 2.0, 2.0",
+                   [Store.name, Store.district, Store.town], q)
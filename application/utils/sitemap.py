@@ -0,0 +1,147 @@
+import threading
+from xml.sax.saxutils import escape as xml_escape
+
+from flask import Response, abort, stream_with_context, url_for
+from sqlalchemy import func
+
+from ..models import db, Product, Store
+
+SITEMAP_LIMIT = 50000  # URLs per file, the sitemaps.org maximum
+
+STATIC_PAGES = [
+    ("main.landing", "weekly", "1.0"),
+    ("main.restuarants", "daily", "0.9"),
+    ("main.about", "monthly", "0.5"),
+    ("main.privacy_policy", "monthly", "0.3"),
+    ("main.terms_conditions", "monthly", "0.3"),
+    ("auth.register", "monthly", "0.6"),
+    ("auth.newlogin", "monthly", "0.6"),
+    ("auth.registerstore", "monthly", "0.6"),
+]
+
+_SENTINEL = 987654321
+
+# Rendered sub-sitemaps keyed by (kind, shard), each tagged with the
+# fingerprint of the rows it was built from.
+_cache = {}
+_lock = threading.Lock()
+
+
+def _active_stores():
+    return db.session.query(Store.id, Store.updated_at).filter(Store.is_active.is_(True))
+
+
+def _active_meals():
+    return (
+        db.session.query(Product.id, Product.updated_at)
+        .join(Store, Product.store_id == Store.id)
+        .filter(Product.is_active.is_(True), Store.is_active.is_(True))
+    )
+
+
+KINDS = {
+    "stores": (_active_stores, Store, "main.store_details", "store_id", "daily", "0.8"),
+    "meals": (_active_meals, Product, "main.viewproduct", "product_id", "weekly", "0.7"),
+}
+
+
+def _fingerprint(kind):
+    """(row count, newest updated_at): changes whenever a URL is added, removed or edited."""
+    query, model = KINDS[kind][0], KINDS[kind][1]
+    count, newest = query().with_entities(func.count(model.id), func.max(model.updated_at)).one()
+    return count, newest
+
+
+def _url_pattern(endpoint, arg):
+    # Build the URL once and splice ids in, instead of url_for per row.
+    prefix, suffix = url_for(endpoint, **{arg: _SENTINEL}, _external=True).split(str(_SENTINEL))
+    return xml_escape(prefix), xml_escape(suffix)
+
+
+def _lastmod(value):
+    return f"<lastmod>{value.strftime('%Y-%m-%d')}</lastmod>" if value else ""
+
+
+def _url(loc, lastmod, changefreq, priority):
+    return f"<url><loc>{loc}</loc>{lastmod}<changefreq>{changefreq}</changefreq><priority>{priority}</priority></url>\n"
+
+
+def _xml_response(body):
+    return Response(body, mimetype="application/xml")
+
+
+# ----------------- Index -----------------
+def sitemap_index_response():
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>\n',
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n',
+        f"<sitemap><loc>{xml_escape(url_for('main.sitemap_shard', kind='pages', shard=1, _external=True))}</loc></sitemap>\n",
+    ]
+    for kind in KINDS:
+        count, newest = _fingerprint(kind)
+        for shard in range(1, max(1, -(-count // SITEMAP_LIMIT)) + 1):
+            loc = xml_escape(url_for("main.sitemap_shard", kind=kind, shard=shard, _external=True))
+            lines.append(f"<sitemap><loc>{loc}</loc>{_lastmod(newest)}</sitemap>\n")
+    lines.append("</sitemapindex>")
+    return _xml_response("".join(lines))
+
+
+# ----------------- Sub-sitemaps -----------------
+def _static_pages():
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n'
+    yield '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for endpoint, changefreq, priority in STATIC_PAGES:
+        yield _url(xml_escape(url_for(endpoint, _external=True)), "", changefreq, priority)
+    yield "</urlset>"
+
+
+def _rows(kind, shard, key, chunks):
+    """Stream one shard while keeping a copy to cache once it completes."""
+    query, model, endpoint, arg, changefreq, priority = KINDS[kind]
+    prefix, suffix = _url_pattern(endpoint, arg)
+
+    def emit(chunk):
+        chunks.append(chunk)
+        return chunk
+
+    yield emit('<?xml version="1.0" encoding="UTF-8"?>\n')
+    yield emit('<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+    rows = (
+        query()
+        .order_by(model.id)
+        .offset((shard - 1) * SITEMAP_LIMIT)
+        .limit(SITEMAP_LIMIT)
+        .yield_per(1000)
+    )
+    batch = []
+    for id, updated_at in rows:
+        batch.append(_url(f"{prefix}{id}{suffix}", _lastmod(updated_at), changefreq, priority))
+        if len(batch) == 1000:
+            yield emit("".join(batch))
+            batch = []
+    if batch:
+        yield emit("".join(batch))
+    yield emit("</urlset>")
+
+    with _lock:
+        _cache[(kind, shard)] = (key, "".join(chunks))
+
+
+def sitemap_shard_response(kind, shard):
+    if kind == "pages":
+        if shard != 1:
+            abort(404)
+        return _xml_response(_static_pages())
+    if kind not in KINDS or shard < 1:
+        abort(404)
+
+    key = _fingerprint(kind)
+    if shard > max(1, -(-key[0] // SITEMAP_LIMIT)):
+        abort(404)
+
+    with _lock:
+        cached = _cache.get((kind, shard))
+    if cached and cached[0] == key:
+        return _xml_response(cached[1])
+
+    return _xml_response(stream_with_context(_rows(kind, shard, key, [])))
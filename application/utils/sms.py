@@ -1,7 +1,23 @@
 import re
+import threading
+import time
+from datetime import datetime, timedelta
 
 import requests
+from requests.adapters import HTTPAdapter
 from flask import current_app
+from sqlalchemy import select, update
+
+from ..models import db, SmsMessage
+from .metrics import metrics
+from .workers import WorkerPool
+
+SMS_QUEUED = "queued"
+SMS_SENDING = "sending"
+SMS_SENT = "sent"
+SMS_FAILED = "failed"
+
+sms_pool = WorkerPool("sms", workers=2, maxsize=500)
 
 
 def normalize_phone_number(value):
@@ -21,34 +37,198 @@ def normalize_phone_number(value):
     return phone if re.fullmatch(r"\+\d{8,15}", phone) else None
 
 
+# ----------------- Rate limiting -----------------
+class TokenBucket:
+    """Allow `rate` sends per second with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block (yielding to other greenlets) until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# ----------------- Provider client -----------------
+class SmsError(Exception):
+    def __init__(self, message, retryable=True, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class TwilioClient:
+    """Twilio Messages API over one pooled, keep-alive requests.Session."""
+
+    def __init__(self, account_sid, auth_token, from_number, base_url, timeout=8, pool_size=2):
+        self.account_sid = account_sid
+        self.from_number = from_number
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.auth = (account_sid, auth_token)
+        self.session.mount(self.base_url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    def send(self, to, body):
+        """Send one message and return the provider sid, or raise SmsError."""
+        url = f"{self.base_url}/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        try:
+            response = self.session.post(
+                url,
+                data={"From": self.from_number, "To": to, "Body": body},
+                timeout=self.timeout,
+            )
+        except requests.RequestException as e:
+            raise SmsError(f"Request failed: {e}")
+
+        if response.status_code == 429 or response.status_code >= 500:
+            retry_after = response.headers.get("Retry-After")
+            raise SmsError(
+                f"Provider returned {response.status_code}",
+                retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+            )
+        if response.status_code >= 400:
+            raise SmsError(f"Provider rejected message: {response.text[:200]}", retryable=False)
+        return response.json().get("sid")
+
+
+_client = None
+_bucket = None
+_client_lock = threading.Lock()
+
+
+def sms_client():
+    """Process-wide client and rate limiter, built from config on first use."""
+    global _client, _bucket
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = current_app.config
+                client = TwilioClient(
+                    config.get("TWILIO_ACCOUNT_SID"),
+                    config.get("TWILIO_AUTH_TOKEN"),
+                    config.get("TWILIO_FROM_NUMBER"),
+                    config.get("TWILIO_API_BASE", "https://api.twilio.com"),
+                    timeout=config.get("SMS_TIMEOUT", 8),
+                    pool_size=config.get("SMS_WORKERS", 2),
+                )
+                if config.get("SMS_BACKEND") == "fake":
+                    from .fake_twilio import FakeTwilioAdapter
+                    client.session.mount(client.base_url, FakeTwilioAdapter())
+                _bucket = TokenBucket(config.get("SMS_RATE_PER_SECOND", 1.0), config.get("SMS_BURST", 5))
+                _client = client
+    return _client, _bucket
+
+
+# ----------------- Delivery queue -----------------
+# The SmsMessage row is the durable record of a text. send_sms writes it
+# together with an outbox "sms" event; the outbox handler only hands the id
+# to sms_pool, so rate limiting, provider calls and retry sleeps happen on
+# the SMS workers and never hold up the outbox's dashboard events.
 def send_sms(to, body):
+    """
+    Record a text and its outbox event on the current session; nothing is
+    sent until the caller commits. Returns the SmsMessage, or None when the
+    message was skipped.
+    """
+    from .outbox import enqueue
+
     to_number = normalize_phone_number(to)
     if not to_number:
         current_app.logger.info("SMS skipped: missing or invalid recipient number.")
-        return False
+        return None
 
     if not current_app.config.get("SMS_ENABLED", False):
         current_app.logger.info("SMS skipped: SMS_ENABLED is false.")
-        return False
-
-    account_sid = current_app.config.get("TWILIO_ACCOUNT_SID")
-    auth_token = current_app.config.get("TWILIO_AUTH_TOKEN")
-    from_number = current_app.config.get("TWILIO_FROM_NUMBER")
+        return None
 
-    if not all([account_sid, auth_token, from_number]):
+    config = current_app.config
+    if not all([config.get("TWILIO_ACCOUNT_SID"), config.get("TWILIO_AUTH_TOKEN"), config.get("TWILIO_FROM_NUMBER")]):
         current_app.logger.warning("SMS skipped: Twilio settings are incomplete.")
-        return False
-
-    url = f"https://api.twilio.com/2010-04-01/Accounts/{account_sid}/Messages.json"
-    try:
-        response = requests.post(
-            url,
-            data={"From": from_number, "To": to_number, "Body": body},
-            auth=(account_sid, auth_token),
-            timeout=8,
-        )
-        response.raise_for_status()
-        return True
-    except requests.RequestException:
-        current_app.logger.exception("SMS send failed.")
-        return False
+        return None
+
+    message = SmsMessage(to=to_number, body=body, status=SMS_QUEUED)
+    db.session.add(message)
+    db.session.flush()
+    enqueue("sms", message_id=message.id)
+    return message
+
+
+def submit_sms(message_id):
+    """Hand a recorded text to the SMS workers; raises SmsError when the queue is full."""
+    if not sms_pool.submit(deliver_sms, message_id):
+        metrics.incr("sms.deferred")
+        raise SmsError("SMS send queue full")
+
+
+def requeue_stale_sms():
+    """
+    Resubmit texts still queued SMS_REQUEUE_AFTER seconds after they were
+    recorded, e.g. because the process stopped before a worker ran them.
+    Texts left "sending" are not retried: the provider may have taken them.
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config.get("SMS_REQUEUE_AFTER", 300))
+    ids = db.session.scalars(
+        select(SmsMessage.id)
+        .where(SmsMessage.status == SMS_QUEUED, SmsMessage.created_at < cutoff)
+        .order_by(SmsMessage.id)
+        .limit(current_app.config.get("SMS_QUEUE_SIZE", 500))
+    ).all()
+    for requeued, message_id in enumerate(ids):
+        if not sms_pool.submit(deliver_sms, message_id):
+            return requeued
+    return len(ids)
+
+
+def deliver_sms(message_id):
+    """Worker job: send one queued text, retrying transient failures with backoff."""
+    claimed = db.session.execute(
+        update(SmsMessage)
+        .where(SmsMessage.id == message_id, SmsMessage.status == SMS_QUEUED)
+        .values(status=SMS_SENDING)
+    ).rowcount == 1
+    db.session.commit()
+    if not claimed:
+        return  # already taken by another submission, sent or failed
+
+    message = db.session.get(SmsMessage, message_id)
+    client, bucket = sms_client()
+    max_attempts = current_app.config.get("SMS_MAX_ATTEMPTS", 4)
+
+    while True:
+        bucket.acquire()
+        message.attempts = (message.attempts or 0) + 1
+        try:
+            with metrics.timer("sms.send"):
+                message.provider_sid = client.send(message.to, message.body)
+        except SmsError as e:
+            message.last_error = str(e)
+            if not e.retryable or message.attempts >= max_attempts:
+                message.status = SMS_FAILED
+                db.session.commit()
+                metrics.incr("sms.failed")
+                current_app.logger.error(f"SMS {message_id} failed after {message.attempts} attempts: {e}")
+                return
+            db.session.commit()
+            time.sleep(e.retry_after or 2 ** message.attempts)
+            continue
+
+        message.status = SMS_SENT
+        message.sent_at = datetime.utcnow()
+        message.last_error = None
+        db.session.commit()
+        metrics.incr("sms.sent")
+        return
@@ -0,0 +1,42 @@
+import threading
+import time
+
+from flask import current_app
+
+from ..models import db, Store
+from .changes import watch
+
+# Bumped after every commit that adds, removes, renames or (de)activates a
+# store. The cached choices remember the version they were built from.
+_version = 0
+_cached = None  # (version, loaded_at, choices)
+_lock = threading.Lock()
+
+
+def active_store_choices():
+    """(id, name) choices for the store selector, sorted by name, with the placeholder first."""
+    global _cached
+    ttl = current_app.config.get("STORE_DIRECTORY_TTL", 300)
+    cached = _cached
+    if cached is None or cached[0] != _version or time.monotonic() - cached[1] > ttl:
+        with _lock:
+            cached = _cached
+            if cached is None or cached[0] != _version or time.monotonic() - cached[1] > ttl:
+                version = _version
+                rows = (
+                    db.session.query(Store.id, Store.name)
+                    .filter(Store.is_active.is_(True))
+                    .order_by(Store.name.asc())
+                    .all()
+                )
+                choices = ((-1, "Select a Store"),) + tuple((id, name) for id, name in rows)
+                cached = _cached = (version, time.monotonic(), choices)
+    return list(cached[2])
+
+
+def _bump_version(keys):
+    global _version
+    _version += 1
+
+
+watch("store_directory", {Store: ("name", "is_active")}, on_commit=_bump_version)
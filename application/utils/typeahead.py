@@ -0,0 +1,275 @@
+import re
+import threading
+import time
+from collections import defaultdict
+
+from flask import current_app
+from sqlalchemy.orm import joinedload
+
+from ..models import db, Product, Store, Category
+from .changes import watch
+from .metrics import metrics
+from .search import search_products, search_stores
+from .workers import WorkerPool
+
+typeahead_pool = WorkerPool("typeahead", workers=1, maxsize=1000)
+
+
+def _tokens(text):
+    return re.findall(r"\w+", (text or "").lower())
+
+
+class TypeaheadIndex:
+    """
+    In-process prefix index over active stores and meals for /api/search.
+
+    Every token of a document is indexed under each of its prefixes (up to
+    max_prefix characters), so a query is a dict lookup per word plus a set
+    intersection. Name tokens score higher than descriptions and locations.
+    The postings budget (one posting per document per prefix) caps memory;
+    documents that would exceed it are left out until a rebuild finds room.
+    """
+
+    def __init__(self, max_postings=1000000, max_prefix=12):
+        self.max_postings = max_postings
+        self.max_prefix = max_prefix
+        self.loaded_at = None
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._docs = {}
+        self._name_tokens = {}
+        self._all_tokens = {}
+        self._prefixes = defaultdict(set)
+        self._postings = 0
+
+    def _prefixes_of(self, tokens):
+        return {token[:n] for token in tokens for n in range(1, min(len(token), self.max_prefix) + 1)}
+
+    # ----------------- Writes -----------------
+    def _put(self, key, doc, name, other):
+        self._remove(key)
+        name_tokens = set(_tokens(name))
+        all_tokens = name_tokens | set(_tokens(other))
+        prefixes = self._prefixes_of(all_tokens)
+        if self._postings + len(prefixes) > self.max_postings:
+            metrics.incr("typeahead.over_budget")
+            return
+        self._docs[key] = doc
+        self._name_tokens[key] = name_tokens
+        self._all_tokens[key] = all_tokens
+        for prefix in prefixes:
+            self._prefixes[prefix].add(key)
+        self._postings += len(prefixes)
+
+    def _remove(self, key):
+        if key not in self._docs:
+            return
+        prefixes = self._prefixes_of(self._all_tokens.pop(key))
+        for prefix in prefixes:
+            postings = self._prefixes.get(prefix)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del self._prefixes[prefix]
+        self._postings -= len(prefixes)
+        del self._docs[key]
+        del self._name_tokens[key]
+
+    def put_store(self, store):
+        with self._lock:
+            if not store.is_active:
+                self._remove(("store", store.id))
+                return
+            doc = {"id": store.id, "name": store.name, "district": store.district or "", "town": store.town or ""}
+            self._put(("store", store.id), doc, store.name, f"{store.district} {store.town}")
+
+    def put_product(self, product):
+        with self._lock:
+            if not product.is_active or not product.store or not product.store.is_active:
+                self._remove(("meal", product.id))
+                return
+            doc = {
+                "id": product.id,
+                "name": product.productname,
+                "price": product.price,
+                "image": product.pictures,
+                "store": product.store.name,
+            }
+            category = product.category.name if product.category else ""
+            self._put(("meal", product.id), doc, product.productname, f"{category} {product.description}")
+
+    def remove(self, kind, id):
+        with self._lock:
+            self._remove((kind, id))
+
+    def rebuild(self):
+        """Reload every active store and meal, then swap the new index in."""
+        fresh = TypeaheadIndex(self.max_postings, self.max_prefix)
+        for store in Store.query.filter(Store.is_active.is_(True)).yield_per(500):
+            fresh.put_store(store)
+        meals = (
+            Product.query
+            .join(Store, Product.store_id == Store.id)
+            .filter(Product.is_active.is_(True), Store.is_active.is_(True))
+            .options(joinedload(Product.store), joinedload(Product.category))
+        )
+        for product in meals.yield_per(500):
+            fresh.put_product(product)
+
+        with self._lock:
+            self._docs, self._name_tokens = fresh._docs, fresh._name_tokens
+            self._all_tokens, self._prefixes = fresh._all_tokens, fresh._prefixes
+            self._postings = fresh._postings
+            self.loaded_at = time.monotonic()
+        metrics.incr("typeahead.rebuilds")
+        return len(self._docs)
+
+    # ----------------- Reads -----------------
+    def search(self, q, limit=5):
+        """Return ([store docs], [meal docs]) whose words start with every query word."""
+        terms = _tokens(q)[:8]
+        if not terms:
+            return [], []
+
+        with self._lock:
+            postings = [self._prefixes.get(term[:self.max_prefix], frozenset()) for term in terms]
+            candidates = set(min(postings, key=len))
+            for p in postings:
+                candidates &= p
+                if not candidates:
+                    return [], []
+
+            scored = []
+            for key in candidates:
+                all_tokens, name_tokens = self._all_tokens[key], self._name_tokens[key]
+                score = 0
+                for term in terms:
+                    if not any(t.startswith(term) for t in all_tokens):
+                        break
+                    if term in name_tokens:
+                        score += 3
+                    elif any(t.startswith(term) for t in name_tokens):
+                        score += 2
+                    else:
+                        score += 1
+                else:
+                    scored.append((-score, self._docs[key]["name"].lower(), key))
+            scored.sort()
+
+            stores, meals = [], []
+            for _, _, key in scored:
+                bucket = stores if key[0] == "store" else meals
+                if len(bucket) < limit:
+                    bucket.append(dict(self._docs[key]))
+            return stores, meals
+
+    def __len__(self):
+        return len(self._docs)
+
+
+typeahead_index = TypeaheadIndex()
+
+
+# ----------------- Loading and patching -----------------
+_loading = False
+_loading_lock = threading.Lock()
+
+
+def _rebuild_job():
+    global _loading
+    try:
+        config = current_app.config
+        typeahead_index.max_postings = config.get("TYPEAHEAD_MAX_POSTINGS", typeahead_index.max_postings)
+        with metrics.timer("typeahead.load"):
+            size = typeahead_index.rebuild()
+        current_app.logger.info(f"Typeahead index rebuilt with {size} entries.")
+    finally:
+        with _loading_lock:
+            _loading = False
+
+
+def schedule_rebuild():
+    """Queue a background rebuild unless one is already queued or running."""
+    global _loading
+    with _loading_lock:
+        if _loading:
+            return True
+        _loading = True
+    if typeahead_pool.submit(_rebuild_job):
+        return True
+    with _loading_lock:
+        _loading = False
+    return False
+
+
+def _search_database(q, limit):
+    """Full-text search in the index's result shape, used until the index is loaded."""
+    stores = search_stores(Store.query.filter(Store.is_active.is_(True)), q).limit(limit).all()
+    meals = (
+        search_products(
+            Product.query
+            .join(Store, Product.store_id == Store.id)
+            .filter(Product.is_active.is_(True), Store.is_active.is_(True))
+            .options(joinedload(Product.store)),
+            q,
+        )
+        .limit(limit)
+        .all()
+    )
+    return (
+        [{"id": s.id, "name": s.name, "district": s.district or "", "town": s.town or ""} for s in stores],
+        [{"id": m.id, "name": m.productname, "price": m.price, "image": m.pictures, "store": m.store.name}
+         for m in meals],
+    )
+
+
+def typeahead_search(q, limit=5):
+    """
+    Search the index. Until its first load finishes, requests are answered
+    from the database while a single background job builds it.
+    """
+    if typeahead_index.loaded_at is None:
+        schedule_rebuild()
+        if typeahead_index.loaded_at is None:
+            metrics.incr("typeahead.fallback")
+            return _search_database(q, limit)
+    elif time.monotonic() - typeahead_index.loaded_at > current_app.config.get("TYPEAHEAD_REFRESH_SECONDS", 900):
+        # Other worker processes patch their own copies; a periodic rebuild
+        # bounds how long this one can drift from the database.
+        schedule_rebuild()
+    with metrics.timer("typeahead.search"):
+        return typeahead_index.search(q, limit)
+
+
+def _patch_job(keys):
+    for kind, id in keys:
+        if kind == "store":
+            store = db.session.get(Store, id)
+            if store is None:
+                typeahead_index.remove("store", id)
+                continue
+            typeahead_index.put_store(store)
+            products = Product.query.filter_by(store_id=id)
+        elif kind == "category":
+            products = Product.query.filter_by(category_id=id)
+        else:
+            product = db.session.get(Product, id)
+            if product is None:
+                typeahead_index.remove("meal", id)
+                continue
+            products = [product]
+        for product in products:
+            typeahead_index.put_product(product)
+
+
+_KINDS = {Store: "store", Product: "meal", Category: "category"}
+
+
+def _patch_after_commit(keys):
+    if typeahead_index.loaded_at is not None:
+        typeahead_pool.submit(_patch_job, sorted((_KINDS[model], id) for model, id in keys))
+
+
+watch("typeahead", dict.fromkeys(_KINDS), on_commit=_patch_after_commit)
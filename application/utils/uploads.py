@@ -0,0 +1,109 @@
+import os
+import secrets
+
+from flask import current_app
+from PIL import Image
+from cloudinary.uploader import upload
+
+from ..models import db, Order
+
+try:
+    from eventlet import patcher, tpool
+except ImportError:  # eventlet is only needed for the socket server
+    patcher = tpool = None
+
+PROOF_PENDING = "pending"
+PROOF_UPLOADED = "uploaded"
+PROOF_FAILED = "failed"
+
+
+# ----------------- Storage backends -----------------
+class CloudinaryProofStorage:
+    def store(self, path):
+        result = upload(
+            path,
+            folder="payment_proofs",
+            use_filename=True,
+            unique_filename=True,
+            resource_type="image",
+            transformation=[{"width": 300, "height": 300, "crop": "fill"}, {"quality": "auto"}],
+        )
+        return result["secure_url"]
+
+
+def _save_thumbnail(path, target_dir):
+    """Shrink the image at path into target_dir, named after its detected format."""
+    with Image.open(path) as img:
+        fmt = img.format
+        filename = secrets.token_hex(9) + ("." + fmt.lower() if fmt != "JPEG" else ".jpg")
+        img.thumbnail((300, 300))
+        img.save(os.path.join(target_dir, filename), format=fmt)
+    return filename
+
+
+class LocalProofStorage:
+    """
+    Filesystem stand-in for Cloudinary (development and tests). Decoding
+    and resizing run on eventlet's native thread pool under monkey
+    patching, so they do not stall the hub.
+    """
+
+    def store(self, path):
+        target_dir = os.path.join(current_app.root_path, current_app.config["UPLOAD_PRODUCTS"])
+        if tpool is not None and patcher.is_monkey_patched("thread"):
+            return tpool.execute(_save_thumbnail, path, target_dir)
+        return _save_thumbnail(path, target_dir)
+
+
+def proof_storage():
+    if current_app.config.get("USE_CLOUDINARY"):
+        return CloudinaryProofStorage()
+    return LocalProofStorage()
+
+
+# ----------------- Pipeline -----------------
+def spool_payment_proof(file):
+    """Write the uploaded screenshot to the local spool and return its path."""
+    spool_dir = current_app.config["PAYMENT_PROOF_SPOOL"]
+    os.makedirs(spool_dir, exist_ok=True)
+    _, f_ex = os.path.splitext(file.filename or "")
+    path = os.path.join(spool_dir, secrets.token_hex(12) + (f_ex.lower() or ".img"))
+    file.save(path)
+    return path
+
+
+def queue_payment_proof(order, spool_path):
+    """
+    Record the upload as an outbox event on the current session, so it
+    commits with the order and survives a restart before it runs.
+    """
+    from .outbox import enqueue
+    enqueue("payment_proof", order_id=order.id, spool_path=spool_path)
+
+
+def process_payment_proof(order_id, spool_path):
+    """
+    Outbox job: upload a spooled screenshot and attach it to the order. A
+    failed upload raises, and the outbox retries it with backoff.
+    """
+    order = db.session.get(Order, order_id)
+    if order is None or order.proof_status != PROOF_PENDING:
+        return  # already handled by an earlier run
+
+    url = proof_storage().store(spool_path)
+    order.screenshot = url
+    order.proof_status = PROOF_UPLOADED
+    db.session.commit()
+
+    try:
+        os.remove(spool_path)
+    except OSError:
+        pass
+
+
+def fail_payment_proof(order_id, spool_path):
+    """Called once the outbox gives up; the spooled file is kept for a manual retry."""
+    current_app.logger.error(f"Payment proof upload gave up | Order:{order_id} File:{spool_path}")
+    Order.query.filter_by(id=order_id, proof_status=PROOF_PENDING).update(
+        {"proof_status": PROOF_FAILED}, synchronize_session=False
+    )
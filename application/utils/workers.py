@@ -0,0 +1,77 @@
+import queue
+import threading
+
+from flask import current_app
+
+
+class WorkerPool:
+    """
+    Fixed number of background workers fed from a bounded queue.
+
+    Jobs run inside an application context. Under eventlet.monkey_patch() the
+    worker threads are green threads, so blocking I/O inside a job yields to
+    the hub instead of stalling request handling. With WORKERS_INLINE set
+    (tests), jobs run synchronously in the caller.
+    """
+
+    def __init__(self, name, workers=4, maxsize=1000):
+        self.name = name
+        self.workers = workers
+        self.maxsize = maxsize
+        self._queue = None
+        self._threads = []
+        self._lock = threading.Lock()
+        self._app = None
+
+    def _ensure_started(self, app):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            self._app = app
+            size = app.config.get(f"{self.name.upper()}_WORKERS", self.workers)
+            maxsize = app.config.get(f"{self.name.upper()}_QUEUE_SIZE", self.maxsize)
+            self._queue = queue.Queue(maxsize=maxsize)
+            for i in range(size):
+                t = threading.Thread(target=self._run, name=f"{self.name}-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, func, *args, **kwargs):
+        """Queue func(*args, **kwargs). Returns False when the queue is full."""
+        app = current_app._get_current_object()
+        if app.config.get("WORKERS_INLINE"):
+            self._call(app, func, args, kwargs)
+            return True
+
+        self._ensure_started(app)
+        try:
+            self._queue.put_nowait((func, args, kwargs))
+            return True
+        except queue.Full:
+            app.logger.warning(f"{self.name} queue full, dropping {func.__name__}.")
+            return False
+
+    def _call(self, app, func, args, kwargs):
+        try:
+            with app.app_context():
+                func(*args, **kwargs)
+        except Exception:
+            app.logger.exception(f"{self.name} job {func.__name__} failed.")
+
+    def _run(self):
+        while True:
+            func, args, kwargs = self._queue.get()
+            try:
+                self._call(self._app, func, args, kwargs)
+            finally:
+                self._queue.task_done()
+
+    def qsize(self):
+        return self._queue.qsize() if self._queue else 0
+
+    def join(self):
+        """Block until every queued job has finished."""
+        if self._queue:
+            self._queue.join()
@@ -0,0 +1,225 @@
+"""
+Compare the per-metric Sales-Order aggregates vendor_analytics ran before
+the sales rollups against application.utils.analytics, which reads the
+rollups once per table and does the group-bys in pandas.
+
+    python benchmarks/vendor_analytics.py --rows 1000000 --window 30
+
+Builds an in-memory SQLite database (TestingConfig) with one store and
+`--rows` sales spread over `--days` days, fills the sales rollups, then
+times both paths over the same window and checks that every figure agrees.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import func, insert  # noqa: E402
+
+from application import create_app, db  # noqa: E402
+from application.models import Store, User, Category, Product, Order, Sales  # noqa: E402
+from application.utils.analytics import WEEKDAY_NAMES, vendor_window_analytics  # noqa: E402
+from application.utils.rollups import rebuild_sales_rollups  # noqa: E402
+
+NET_MULTIPLIER = 0.9
+CHUNK = 50000
+
+
+def seed(rows, days, users=2000, products=200, categories=12, items_per_order=4, seed=7):
+    rng = np.random.default_rng(seed)
+    store = Store(name="Bench Store", email="bench@store.test", phone="0", password="x")
+    db.session.add(store)
+    db.session.flush()
+
+    db.session.execute(insert(User.__table__), [
+        {"username": f"user{i}", "lastname": "Bench", "email": f"user{i}@bench.test", "password": "x"}
+        for i in range(users)
+    ])
+    db.session.execute(insert(Category.__table__), [
+        {"name": f"Category {i}", "store_id": store.id, "is_active": True} for i in range(categories)
+    ])
+    user_ids = np.array([id for (id,) in db.session.query(User.id)])
+    category_ids = [id for (id,) in db.session.query(Category.id)]
+    prices = rng.integers(20, 200, products).astype(float)
+    db.session.execute(insert(Product.__table__), [
+        {
+            "productname": f"Meal {i}", "price": prices[i], "pictures": "x", "description": "x",
+            "quantity": 100, "category_id": category_ids[i % categories], "store_id": store.id,
+        }
+        for i in range(products)
+    ])
+    product_ids = np.array([id for (id,) in db.session.query(Product.id).order_by(Product.id)])
+
+    orders = rows // items_per_order
+    now = datetime.utcnow()
+    order_times = now - timedelta(days=days) + rng.random(orders) * timedelta(days=days)
+    order_users = rng.choice(user_ids, orders)
+    statuses = rng.choice(["Completed", "Delivered", "Pending", "Cancelled"], orders, p=[.6, .2, .1, .1])
+    for start in range(0, orders, CHUNK):
+        db.session.execute(insert(Order.__table__), [
+            {
+                "store_id": store.id, "location": "bench", "status": str(statuses[i]),
+                "create_at": order_times[i], "user_id": int(order_users[i]),
+            }
+            for i in range(start, min(start + CHUNK, orders))
+        ])
+    order_ids = np.array([id for (id,) in db.session.query(Order.id).order_by(Order.id)])
+
+    picks = rng.integers(0, products, rows)
+    sale_orders = np.repeat(np.arange(orders), items_per_order)[:rows]
+    quantities = rng.integers(1, 4, rows)
+    for start in range(0, rows, CHUNK):
+        db.session.execute(insert(Sales.__table__), [
+            {
+                "order_id": int(order_ids[sale_orders[i]]), "user_id": int(order_users[sale_orders[i]]),
+                "product_id": int(product_ids[picks[i]]), "product_name": f"Meal {picks[i]}",
+                "price": prices[picks[i]], "quantity": int(quantities[i]), "store_id": store.id,
+                "date_": order_times[sale_orders[i]],
+            }
+            for i in range(start, min(start + CHUNK, rows))
+        ])
+    db.session.commit()
+    return store.id
+
+
+def baseline_queries(store_id, start_date, end_date, prev_start, prev_end):
+    """
+    The windowed aggregates vendor_analytics ran before the sales rollups:
+    one Sales-Order join per figure, filtered on func.date(Sales.date_).
+    """
+    net_amount = (Sales.price * Sales.quantity) * NET_MULTIPLIER
+    base_filter = [Sales.store_id == store_id, Order.status != "Cancelled"]
+
+    def windowed(query, start, end):
+        return (query.join(Order, Order.id == Sales.order_id)
+                .filter(*base_filter)
+                .filter(func.date(Sales.date_).between(start, end)))
+
+    def sales(start, end):
+        return windowed(db.session.query(func.sum(net_amount)), start, end).scalar() or 0
+
+    def orders(start, end):
+        return windowed(db.session.query(func.count(Sales.order_id.distinct())), start, end).scalar() or 0
+
+    def grouped(column, *joins, limit=None):
+        query = db.session.query(column, func.sum(net_amount)).select_from(Sales)
+        for target, on in joins:
+            query = query.join(target, on)
+        query = windowed(query, start_date, end_date).group_by(column)
+        if limit:
+            query = query.order_by(func.sum(net_amount).desc()).limit(limit)
+        return query
+
+    hour, dow, day = func.extract("hour", Sales.date_), func.extract("dow", Sales.date_), func.date(Sales.date_)
+    return {
+        "total_sales": sales(start_date, end_date),
+        "prev_sales": sales(prev_start, prev_end),
+        "total_orders": orders(start_date, end_date),
+        "prev_orders": orders(prev_start, prev_end),
+        "trend": grouped(day).order_by(day).all(),
+        "products": grouped(Product.productname, (Product, Product.id == Sales.product_id), limit=5).all(),
+        "categories": grouped(
+            Category.name, (Product, Product.id == Sales.product_id), (Category, Category.id == Product.category_id)
+        ).all(),
+        "top_customers": grouped(User.username, (User, User.id == Sales.user_id), limit=5).all(),
+        "hourly": grouped(hour).order_by(hour).all(),
+        "weekday": grouped(dow).order_by(dow).all(),
+    }
+
+
+def as_engine_shape(baseline):
+    """Baseline rows keyed the way vendor_window_analytics returns them."""
+    return {
+        "total_sales": baseline["total_sales"],
+        "prev_sales": baseline["prev_sales"],
+        "total_orders": baseline["total_orders"],
+        "prev_orders": baseline["prev_orders"],
+        "trend": {str(day): revenue for day, revenue in baseline["trend"]},
+        "products": dict(baseline["products"]),
+        "categories": dict(baseline["categories"]),
+        "top_customers": dict(baseline["top_customers"]),
+        "hourly": {int(hour): revenue for hour, revenue in baseline["hourly"]},
+        "weekday": {WEEKDAY_NAMES[int(dow)]: revenue for dow, revenue in baseline["weekday"]},
+    }
+
+
+def engine_shape(engine):
+    return {
+        "total_sales": engine["total_sales"],
+        "prev_sales": engine["prev_sales"],
+        "total_orders": engine["total_orders"],
+        "prev_orders": engine["prev_orders"],
+        "trend": dict(zip(engine["dates"], engine["revenues"])),
+        "products": dict(zip(engine["prod_names"], engine["prod_revenues"])),
+        "categories": dict(zip(engine["categories"], engine["cat_revenue"])),
+        "top_customers": dict(engine["top_customers"]),
+        "hourly": dict(zip(engine["hours"], engine["hourly_revenue"])),
+        "weekday": dict(zip(engine["weekdays"], engine["weekday_revenue"])),
+    }
+
+
+def close(a, b):
+    return abs(float(a) - float(b)) <= 1e-6 * max(1.0, abs(float(a)))
+
+
+def check_parity(baseline, engine):
+    for key, expected in baseline.items():
+        actual = engine[key]
+        if isinstance(expected, dict):
+            assert expected.keys() == actual.keys(), f"{key}: {sorted(expected)} != {sorted(actual)}"
+            for name, value in expected.items():
+                assert close(value, actual[name]), f"{key}[{name}]: {value} != {actual[name]}"
+        else:
+            assert close(expected, actual), f"{key}: {expected} != {actual}"
+
+
+def best_of(repeat, fn, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--window", type=int, default=30, help="analytics window in days")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    app = create_app("testing")
+    with app.app_context():
+        db.create_all()
+        start = time.perf_counter()
+        store_id = seed(args.rows, args.days)
+        rebuild_sales_rollups()
+        print(f"seeded {args.rows:,} sales and their rollups in {time.perf_counter() - start:.1f}s")
+
+        end_date = datetime.utcnow().date()
+        start_date = end_date - timedelta(days=args.window)
+        prev_start, prev_end = start_date - timedelta(days=args.window), start_date
+
+        baseline_time, baseline = best_of(
+            args.repeat, baseline_queries, store_id, start_date, end_date, prev_start, prev_end
+        )
+        engine_time, engine = best_of(
+            args.repeat, vendor_window_analytics, store_id, start_date, end_date, prev_start, prev_end, NET_MULTIPLIER
+        )
+        check_parity(as_engine_shape(baseline), engine_shape(engine))
+
+        print(f"window {args.window} days, best of {args.repeat}")
+        print(f"  per-metric Sales joins : {baseline_time * 1000:8.1f} ms")
+        print(f"  rollup frames          : {engine_time * 1000:8.1f} ms")
+        print(f"  speedup                : {baseline_time / engine_time:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
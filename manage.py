@@ -33,8 +33,39 @@ def make_shell_context():
         "Product": Product
     }
 
+# Full-text search index
+@app.cli.command("search-index")
+def search_index():
+    """Create (if missing) and rebuild the product/store full-text index."""
+    from application.utils.search import install_search_index
+    install_search_index()
+    print("Search index rebuilt.")
+
+# Login account directory
+@app.cli.command("account-directory")
+def account_directory():
+    """Rebuild the email -> account lookup table used by login."""
+    from application.utils.accounts import rebuild_account_directory
+    rebuild_account_directory()
+    print("Account directory rebuilt.")
+
+# Sales rollups for the store and admin dashboards
+@app.cli.command("sales-rollups")
+def sales_rollups():
+    """Rebuild the daily, product and hourly sales rollups from Sales."""
+    from application.utils.rollups import rebuild_sales_rollups
+    rows = rebuild_sales_rollups()
+    print(f"Sales rollups rebuilt ({rows} rows).")
+
 # Development only
 if __name__ == "__main__":
+    # Load the /api/search typeahead index in the background before serving
+    from application.utils.typeahead import schedule_rebuild
+    from application.utils.outbox import start_dispatcher
+    with app.app_context():
+        schedule_rebuild()
+    start_dispatcher(app)
+
     #app.run('0.0.0.0', port=5000, debug=True)
     socketio.run(
        app,
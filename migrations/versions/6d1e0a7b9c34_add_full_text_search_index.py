@@ -0,0 +1,115 @@
+"""add full-text search index for products and stores
+
+Revision ID: 6d1e0a7b9c34
+Revises: 3f7a9b1c5d28
+Create Date: 2026-10-18 14:21:50.337102
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6d1e0a7b9c34'
+down_revision = '3f7a9b1c5d28'
+branch_labels = None
+depends_on = None
+
+
+# SQLite (dev): external-content FTS5 tables kept in sync by triggers.
+SQLITE_UPGRADE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        productname, description,
+        content='product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, productname, description)
+        VALUES (new.id, new.productname, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, productname, description)
+        VALUES ('delete', old.id, old.productname, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF productname, description ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, productname, description)
+        VALUES ('delete', old.id, old.productname, old.description);
+        INSERT INTO product_fts(rowid, productname, description)
+        VALUES (new.id, new.productname, new.description);
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS store_fts USING fts5(
+        name, district, town,
+        content='store', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS store_fts_ai AFTER INSERT ON store BEGIN
+        INSERT INTO store_fts(rowid, name, district, town)
+        VALUES (new.id, new.name, new.district, new.town);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_fts_ad AFTER DELETE ON store BEGIN
+        INSERT INTO store_fts(store_fts, rowid, name, district, town)
+        VALUES ('delete', old.id, old.name, old.district, old.town);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_fts_au AFTER UPDATE OF name, district, town ON store BEGIN
+        INSERT INTO store_fts(store_fts, rowid, name, district, town)
+        VALUES ('delete', old.id, old.name, old.district, old.town);
+        INSERT INTO store_fts(rowid, name, district, town)
+        VALUES (new.id, new.name, new.district, new.town);
+    END""",
+    """INSERT INTO product_fts(product_fts) VALUES ('rebuild')""",
+    """INSERT INTO store_fts(store_fts) VALUES ('rebuild')""",
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS store_fts_au",
+    "DROP TRIGGER IF EXISTS store_fts_ad",
+    "DROP TRIGGER IF EXISTS store_fts_ai",
+    "DROP TABLE IF EXISTS store_fts",
+    "DROP TRIGGER IF EXISTS product_fts_au",
+    "DROP TRIGGER IF EXISTS product_fts_ad",
+    "DROP TRIGGER IF EXISTS product_fts_ai",
+    "DROP TABLE IF EXISTS product_fts",
+]
+
+# Postgres (production): generated tsvector columns with GIN indexes.
+POSTGRES_UPGRADE = [
+    """ALTER TABLE product ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(productname, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(description, '')), 'B')
+        ) STORED""",
+    """CREATE INDEX IF NOT EXISTS ix_product_search_vector ON product USING gin (search_vector)""",
+    """ALTER TABLE store ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('simple', coalesce(district, '')), 'B') ||
+            setweight(to_tsvector('simple', coalesce(town, '')), 'B')
+        ) STORED""",
+    """CREATE INDEX IF NOT EXISTS ix_store_search_vector ON store USING gin (search_vector)""",
+]
+
+POSTGRES_DOWNGRADE = [
+    "DROP INDEX IF EXISTS ix_store_search_vector",
+    "ALTER TABLE store DROP COLUMN IF EXISTS search_vector",
+    "DROP INDEX IF EXISTS ix_product_search_vector",
+    "ALTER TABLE product DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(statements):
+    for statement in statements:
+        op.execute(statement)
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _run(SQLITE_UPGRADE)
+    elif dialect == 'postgresql':
+        _run(POSTGRES_UPGRADE)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        _run(SQLITE_DOWNGRADE)
+    elif dialect == 'postgresql':
+        _run(POSTGRES_DOWNGRADE)